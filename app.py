@@ -10,6 +10,8 @@ from components.calendar_view import render_calendar
 from components.mascot import Mascot
 from utils.metrics import MetricsTracker
 from utils.firebase_ops import FirebaseOps
+from utils.interaction_logger import InteractionLogger
+from utils.ingest_queue import IngestionQueue
 import time
 
 st.set_page_config(
@@ -48,6 +50,14 @@ def init_session_state():
 # Call initialization
 init_session_state()
 
+@st.cache_resource
+def start_background_workers():
+    """Start ingestion workers once per process, re-queuing jobs a previous process left unfinished"""
+    IngestionQueue.start()
+    return True
+
+start_background_workers()
+
 # Initialize metrics only when user is logged in
 if st.session_state.user:
     MetricsTracker.init_session()
@@ -231,6 +241,9 @@ else:
                 except Exception as e:
                     st.warning(f"Could not save session data: {e}")
             
+            # Write this session's buffered events without waiting for the next interval
+            InteractionLogger.flush_soon()
+            
             metrics = MetricsTracker.get_metrics_summary()
             st.success(f"""
                 ✨ Session Complete! ✨
@@ -1,5 +1,11 @@
 import streamlit as st
 from config.firebase_config import db
+from utils.qdrant_ops import QdrantRAG
+from utils.firebase_ops import FirebaseOps
+from utils.interaction_logger import InteractionLogger
+from utils.cache import TTLCache
+from firebase_admin import firestore
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import hashlib
 import time
@@ -16,8 +22,33 @@ def verify_admin(email, password):
     """Verify admin credentials - simple check"""
     return email == ADMIN_EMAIL and password == ADMIN_PASSWORD
 
-def get_analytics_data():
-    """Fetch all analytics data from Firebase"""
+# Cached analytics snapshot, shared by admin sessions (see get_analytics_data)
+_analytics_cache = TTLCache(maxsize=1, ttl=300)
+
+def get_analytics_cache_ttl():
+    """Seconds an analytics snapshot is reused, from admin.analytics_cache_ttl in secrets"""
+    try:
+        return float(st.secrets.get("admin", {}).get("analytics_cache_ttl", 300))
+    except Exception:
+        return 300.0
+
+def run_aggregation(aggregation_query):
+    """Run a Firestore aggregation query and return its single value"""
+    result = aggregation_query.get()
+    return result[0][0].value or 0
+
+def get_analytics_data(force_refresh=False):
+    """
+    Fetch analytics from Firebase. KPIs come from count/sum aggregation
+    queries run concurrently, so no documents are downloaded just to be
+    counted. The snapshot is cached for admin.analytics_cache_ttl seconds
+    (default 300); force_refresh recomputes it.
+    """
+    if not force_refresh:
+        cached = _analytics_cache.get('analytics')
+        if cached is not None:
+            return cached
+    
     try:
         analytics = {
             'total_resources': 0,
@@ -34,89 +65,102 @@ def get_analytics_data():
             'top_subjects': [],
             'user_activity': [],
             'total_messages': 0,
-            'total_uploads': 0
+            'total_uploads': 0,
+            'generated_at': datetime.now()
         }
         
-        # 1. Get total resources
-        all_files = list(db.collection('uploaded_files').stream())
-        analytics['total_resources'] = len(all_files)
-        analytics['approved_resources'] = sum(1 for f in all_files if f.to_dict().get('verified', False))
+        files = db.collection('uploaded_files')
+        interactions = db.collection('interactions')
+        sessions = db.collection('sessions')
+        finished_sessions = sessions.where(field_path='duration_seconds', op_string='>', value=0)
+        
+        aggregations = {
+            'total_resources': files.count(),
+            'approved_resources': files.where(field_path='verified', op_string='==', value=True).count(),
+            'total_ad_impressions': interactions.where(field_path='event_type', op_string='==', value='ad_shown').count(),
+            'total_messages': interactions.where(field_path='event_type', op_string='==', value='message_sent').count(),
+            'total_uploads': interactions.where(field_path='event_type', op_string='==', value='file_upload').count(),
+            'total_users': db.collection('users').count(),
+            'total_sessions': sessions.count(),
+            'finished_sessions': finished_sessions.count(),
+            'total_duration': finished_sessions.sum('duration_seconds'),
+        }
+        
+        with ThreadPoolExecutor(max_workers=len(aggregations) + 2) as executor:
+            futures = {key: executor.submit(run_aggregation, query) for key, query in aggregations.items()}
+            
+            # Recent uploads (last 10), newest first
+            recent_future = executor.submit(lambda: list(
+                files.order_by('upload_time', direction=firestore.Query.DESCENDING)
+                .select(['file_name', 'subject', 'upload_time', 'verified'])
+                .limit(10)
+                .stream()
+            ))
+            
+            # Per-user session counts have no aggregation equivalent - fetch only user_id
+            session_users_future = executor.submit(lambda: [
+                doc.to_dict().get('user_id', 'unknown')
+                for doc in sessions.select(['user_id']).stream()
+            ])
+            
+            # Resources by subject from the maintained counters (one read per subject)
+            subject_stats = FirebaseOps.get_subject_stats()
+            
+            totals = {key: future.result() for key, future in futures.items()}
+            recent_docs = recent_future.result()
+            session_users = session_users_future.result()
+        
+        # 1. Resources
+        analytics['total_resources'] = totals['total_resources']
+        analytics['approved_resources'] = totals['approved_resources']
         analytics['pending_resources'] = analytics['total_resources'] - analytics['approved_resources']
         
-        # Resources by subject
-        for doc in all_files:
-            file_data = doc.to_dict()
-            if file_data.get('verified', False):
-                subject = file_data.get('subject', 'Unknown')
-                analytics['resources_by_subject'][subject] = analytics['resources_by_subject'].get(subject, 0) + 1
+        for subject, stats in subject_stats.items():
+            if stats.get('verified', 0) > 0:
+                analytics['resources_by_subject'][subject] = stats['verified']
         
         # Top 5 subjects
         sorted_subjects = sorted(analytics['resources_by_subject'].items(), key=lambda x: x[1], reverse=True)
         analytics['top_subjects'] = sorted_subjects[:5]
         
-        # Recent uploads (last 10)
-        sorted_files = sorted(all_files, key=lambda x: x.to_dict().get('upload_time', datetime.min), reverse=True)
+        recent_uploads = [doc.to_dict() for doc in recent_docs]
         analytics['recent_uploads'] = [
             {
-                'file_name': f.to_dict().get('file_name', 'Unknown'),
-                'subject': f.to_dict().get('subject', 'Unknown'),
-                'upload_time': f.to_dict().get('upload_time'),
-                'verified': f.to_dict().get('verified', False)
+                'file_name': file_data.get('file_name', 'Unknown'),
+                'subject': file_data.get('subject', 'Unknown'),
+                'upload_time': file_data.get('upload_time'),
+                'verified': file_data.get('verified', False)
             }
-            for f in sorted_files[:10]
+            for file_data in recent_uploads
         ]
         
-        # 2. Get all interactions data
-        interactions = list(db.collection('interactions').stream())
-        
-        # Count ad impressions
-        ad_impressions = [i for i in interactions if i.to_dict().get('event_type') == 'ad_shown']
-        analytics['total_ad_impressions'] = len(ad_impressions)
-        
-        # Count messages sent
-        messages_sent = [i for i in interactions if i.to_dict().get('event_type') == 'message_sent']
-        analytics['total_messages'] = len(messages_sent)
+        # 2. Interactions
+        analytics['total_ad_impressions'] = totals['total_ad_impressions']
+        analytics['total_messages'] = totals['total_messages']
+        analytics['total_uploads'] = totals['total_uploads']
         
-        # Count file uploads from interactions
-        uploads = [i for i in interactions if i.to_dict().get('event_type') == 'file_upload']
-        analytics['total_uploads'] = len(uploads)
+        # 3. Users
+        analytics['total_users'] = totals['total_users']
         
-        # 3. Get user data
-        all_users = list(db.collection('users').stream())
-        analytics['total_users'] = len(all_users)
-        
-        # 4. Get session data
-        all_sessions = list(db.collection('sessions').stream())
-        analytics['total_sessions'] = len(all_sessions)
+        # 4. Sessions
+        analytics['total_sessions'] = totals['total_sessions']
+        if totals['finished_sessions'] > 0:
+            analytics['avg_session_duration'] = totals['total_duration'] / totals['finished_sessions']
         
         # Calculate returning users (users with more than 1 session)
         user_session_counts = {}
-        total_duration = 0
-        valid_durations = 0
-        
-        for session in all_sessions:
-            session_data = session.to_dict()
-            user_id = session_data.get('user_id', 'unknown')
-            
-            # Count sessions per user
+        for user_id in session_users:
             user_session_counts[user_id] = user_session_counts.get(user_id, 0) + 1
-            
-            # Calculate average session duration
-            duration = session_data.get('duration_seconds', 0)
-            if duration > 0:
-                total_duration += duration
-                valid_durations += 1
         
         analytics['returning_users'] = sum(1 for count in user_session_counts.values() if count > 1)
         analytics['sessions_per_user'] = user_session_counts
         
-        if valid_durations > 0:
-            analytics['avg_session_duration'] = total_duration / valid_durations
-        
         # 5. User activity (top 10 most active users)
         sorted_users = sorted(user_session_counts.items(), key=lambda x: x[1], reverse=True)
         analytics['user_activity'] = sorted_users[:10]
         
+        _analytics_cache.ttl = get_analytics_cache_ttl()
+        _analytics_cache.set('analytics', analytics)
         return analytics
         
     except Exception as e:
@@ -172,6 +216,12 @@ def cleanup_all_documents():
                     deleted_count += 1
                     progress_bar.progress((idx + 1) / len(all_files))
                 
+                # Everything is gone, so recounting just clears the counters
+                FirebaseOps.rebuild_subject_stats()
+                FirebaseOps.invalidate_file_listings()
+                # Vectors and keyword indexes too, or search keeps finding the deleted files
+                QdrantRAG.delete_all_documents()
+                
                 st.success(f"✅ Deleted {deleted_count} documents!")
                 st.balloons()
                 time.sleep(2)
@@ -215,10 +265,14 @@ def render_admin_panel():
     with tab1:
         st.header("📊 Platform Analytics Dashboard")
         
+        refresh = st.button("🔄 Refresh Analytics", key="refresh_analytics")
+        
         with st.spinner("🔄 Loading comprehensive analytics..."):
-            analytics = get_analytics_data()
+            analytics = get_analytics_data(force_refresh=refresh)
         
         if analytics:
+            st.caption(f"Snapshot from {analytics['generated_at'].strftime('%H:%M:%S')} (cached for {int(get_analytics_cache_ttl())}s)")
+            
             # ===== MAIN METRICS ROW =====
             st.markdown("### 📈 Key Performance Indicators")
             col1, col2, col3, col4 = st.columns(4)
@@ -515,6 +569,47 @@ def render_admin_panel():
                 else:
                     st.info("No resources yet")
             
+            # ===== RAG CACHE PERFORMANCE =====
+            with st.expander("⚡ RAG Cache Performance", expanded=False):
+                query_stats = QdrantRAG.get_query_cache_stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Query Embedding Hits", query_stats['hits'])
+                with col2:
+                    st.metric("Query Embedding Misses", query_stats['misses'])
+                with col3:
+                    st.metric("Hit Rate", f"{query_stats['hit_rate']*100:.1f}%")
+                
+                answer_stats = QdrantRAG.get_response_cache().stats()
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Answer Cache Hits", answer_stats['hits'])
+                with col2:
+                    st.metric("Answer Cache Misses", answer_stats['misses'])
+                with col3:
+                    st.metric("Cached Answers", answer_stats['size'])
+            
+            # ===== EVENT LOGGER =====
+            with st.expander("📝 Interaction Logger", expanded=False):
+                logger_stats = InteractionLogger.stats()
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Events Written", logger_stats['written'])
+                with col2:
+                    st.metric("Buffered", logger_stats['buffered'])
+                with col3:
+                    st.metric("Dropped", logger_stats['dropped'])
+                with col4:
+                    st.metric("Failed Flushes", logger_stats['failed_flushes'])
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Last Flush", f"{logger_stats['last_flush_ms']:.0f} ms")
+                with col2:
+                    st.metric("Avg Flush", f"{logger_stats['avg_flush_ms']:.0f} ms")
+                with col3:
+                    st.metric("Max Queue Delay", f"{logger_stats['max_queue_delay_ms']:.0f} ms")
+            
             # ===== EXPORT ANALYTICS REPORT =====
             st.markdown("---")
             st.markdown("### 📥 Export Data")
@@ -627,16 +722,17 @@ Report End - StudyHub Analytics System
                     
                     with col2:
                         if st.button("✅", key=f"approve_{doc.id}", use_container_width=True):
-                            db.collection('uploaded_files').document(doc.id).update({
-                                'verified': True,
-                                'approved_at': datetime.now()
-                            })
+                            FirebaseOps.set_file_verified(doc.id)
+                            QdrantRAG.set_document_verified(file_data.get('subject'), doc.id)
+                            QdrantRAG.invalidate_subject_cache(file_data.get('subject'))
                             st.success("Approved!")
                             time.sleep(1)
                             st.rerun()
                         
                         if st.button("❌", key=f"reject_{doc.id}", use_container_width=True):
-                            db.collection('uploaded_files').document(doc.id).delete()
+                            FirebaseOps.delete_uploaded_file(doc.id)
+                            QdrantRAG.delete_document(file_data.get('subject'), doc.id)
+                            QdrantRAG.invalidate_subject_cache(file_data.get('subject'))
                             st.warning("Deleted!")
                             time.sleep(1)
                             st.rerun()
@@ -671,16 +767,15 @@ Report End - StudyHub Analytics System
         # Show existing subjects first
         st.markdown("### Current Subjects")
         try:
-            existing_subjects = list(db.collection('subjects').stream())
+            existing_subjects = FirebaseOps.get_subjects()
             if existing_subjects:
-                for doc in existing_subjects:
-                    data = doc.to_dict()
+                for doc_id, data in existing_subjects:
                     col1, col2 = st.columns([4, 1])
                     with col1:
                         st.markdown(f"{data.get('icon', '📚')} **{data.get('name', 'Unknown')}** - {data.get('category', 'N/A')}")
                     with col2:
-                        if st.button("🗑️", key=f"del_subj_{doc.id}"):
-                            db.collection('subjects').document(doc.id).delete()
+                        if st.button("🗑️", key=f"del_subj_{doc_id}"):
+                            db.collection('subjects').document(doc_id).delete()
                             st.success(f"Deleted {data.get('name', 'subject')}!")
                             time.sleep(1)
                             st.rerun()
@@ -773,6 +868,17 @@ Report End - StudyHub Analytics System
         
         st.markdown("---")
         
+        st.subheader("🔢 Resource Counters")
+        st.write("Recount the per-subject resource counters from uploaded files (use if counts look off)")
+        if st.button("🔄 Rebuild Counters", key="rebuild_subject_stats"):
+            try:
+                counts = FirebaseOps.rebuild_subject_stats()
+                st.success(f"✅ Rebuilt counters for {len(counts)} subjects")
+            except Exception as e:
+                st.error(f"Error rebuilding counters: {e}")
+        
+        st.markdown("---")
+        
         st.subheader("📋 Current Documents")
         try:
             all_files = list(db.collection('uploaded_files').stream())
@@ -791,7 +897,9 @@ Report End - StudyHub Analytics System
                     
                     with col2:
                         if st.button("🗑️", key=f"del_{doc.id}"):
-                            db.collection('uploaded_files').document(doc.id).delete()
+                            FirebaseOps.delete_uploaded_file(doc.id)
+                            QdrantRAG.delete_document(file_data.get('subject'), doc.id)
+                            QdrantRAG.invalidate_subject_cache(file_data.get('subject'))
                             st.rerun()
         
         except Exception as e:
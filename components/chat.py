@@ -2,7 +2,6 @@ import streamlit as st
 from utils.firebase_ops import FirebaseOps
 from utils.metrics import MetricsTracker
 from utils.qdrant_ops import QdrantRAG
-from config.firebase_config import db
 
 def render_chat():
     """Render AI chat interface with REAL RAG functionality"""
@@ -78,14 +77,7 @@ def render_chat():
     # Get subject files
     subject_full_name = f"{subject['name']} ({subject.get('category', 'General')})"
     try:
-        all_files = list(db.collection('uploaded_files').stream())
-        subject_files = []
-        
-        for doc in all_files:
-            file_data = doc.to_dict()
-            if file_data.get('verified', False):
-                if file_data.get('subject') == subject_full_name:
-                    subject_files.append((doc.id, file_data))
+        subject_files = FirebaseOps.list_verified_files(subject_full_name, fields=['file_name', 'file_size'])
     except Exception as e:
         st.error(f"Error loading files: {e}")
         subject_files = []
@@ -124,7 +116,7 @@ def render_chat():
                         response += f"### {idx}. {file_name}\n\n"
                         
                         # Get actual summary from Qdrant
-                        summary = QdrantRAG.get_document_summary(file_name, subject_full_name)
+                        summary = QdrantRAG.get_document_summary(file_name, subject_full_name, doc_id=doc_id)
                         
                         if summary and len(summary) > 50:
                             response += f"{summary}\n\n"
@@ -277,13 +269,28 @@ def render_chat():
         })
         MetricsTracker.track_message()
         
-        # REAL RAG RESPONSE
+        # REAL RAG RESPONSE - rendered token by token as it streams in
+        st.markdown(f'<div class="user-message">{prompt}</div>', unsafe_allow_html=True)
+        answer_placeholder = st.empty()
+        ai_response = ""
+        
         with st.spinner("🔍 Searching through documents with AI..."):
-            ai_response = QdrantRAG.generate_rag_response(
+            response_stream = QdrantRAG.generate_rag_response_stream(
                 query=prompt,
                 subject=subject_full_name,
                 language=language
             )
+            # Keep the spinner until the first piece of text arrives
+            first_piece = next(response_stream, "")
+        
+        ai_response += first_piece
+        answer_placeholder.markdown(f'<div class="ai-message">{ai_response}▌</div>', unsafe_allow_html=True)
+        
+        for piece in response_stream:
+            ai_response += piece
+            answer_placeholder.markdown(f'<div class="ai-message">{ai_response}▌</div>', unsafe_allow_html=True)
+        
+        answer_placeholder.markdown(f'<div class="ai-message">{ai_response}</div>', unsafe_allow_html=True)
         
         st.session_state.messages.append({'role': 'assistant', 'content': ai_response})
         st.rerun()
\ No newline at end of file
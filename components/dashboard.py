@@ -1,16 +1,19 @@
 import streamlit as st
 from utils.firebase_ops import FirebaseOps
 from utils.metrics import MetricsTracker
-from utils.qdrant_ops import QdrantRAG
-from config.firebase_config import db
+from utils.ingest_queue import IngestionQueue
 import base64
 
+# Files shown per page in the download modal, and the fields it needs
+DOWNLOAD_PAGE_SIZE = 20
+DOWNLOAD_FIELDS = ['file_name', 'file_size', 'upload_time', 'storage_path']
+
 def render_dashboard():
     """Render cute main dashboard with subject selection + REAL DOWNLOAD"""
     
-    # Get subjects from Firebase (dynamic)
+    # Get subjects from Firebase (dynamic, served from the listener-backed cache)
     try:
-        subjects_docs = list(db.collection('subjects').stream())
+        subjects_docs = FirebaseOps.get_subjects()
         if len(subjects_docs) == 0:
             # Default subjects if none exist
             subjects = [
@@ -20,11 +23,10 @@ def render_dashboard():
             ]
         else:
             subjects = []
-            for doc in subjects_docs:
-                data = doc.to_dict()
+            for doc_id, data in subjects_docs:
                 # Ensure all required fields exist with defaults
                 subject = {
-                    'id': data.get('id', doc.id),  # Use doc.id as fallback
+                    'id': data.get('id', doc_id),  # Use doc_id as fallback
                     'name': data.get('name', 'Unknown Subject'),
                     'category': data.get('category', 'General'),
                     'icon': data.get('icon', '📚'),
@@ -99,24 +101,16 @@ def render_dashboard():
     st.title("✨ Your Study Space ✨")
     st.write("Pick a subject and start your learning journey~")
     
-    # Get real resource counts from Firebase
+    # Get real resource counts from the per-subject counters (one read per subject)
     try:
-        all_files = list(db.collection('uploaded_files').stream())
-        verified_files = [doc for doc in all_files if doc.to_dict().get('verified', False)]
-        
-        # Count resources per subject - EXACT MATCH ONLY
-        subject_counts = {}
-        for doc in verified_files:
-            subject_name = doc.to_dict().get('subject', '')
-            if subject_name:  # Only count if subject is not empty
-                subject_counts[subject_name] = subject_counts.get(subject_name, 0) + 1
+        subject_stats = FirebaseOps.get_subject_stats()
         
         # Update subjects with real counts - EXACT MATCH
         for subject in subjects:
             # Build the exact subject string as stored in Firebase
             subject_full_name = f"{subject['name']} ({subject.get('category', 'General')})"
             # Get exact match count
-            subject['resources'] = subject_counts.get(subject_full_name, 0)
+            subject['resources'] = max(0, subject_stats.get(subject_full_name, {}).get('verified', 0))
     except Exception as e:
         st.error(f"Error loading resource counts: {e}")
         for subject in subjects:
@@ -156,16 +150,13 @@ def render_dashboard():
         st.markdown("---")
         st.markdown(f"## 📥 Download Resources: {subject['icon']} {subject['name']}")
         
-        # Get files for this subject
+        # Get files for this subject one page at a time (kept for this session while the modal is open)
+        page_key = f"download_files_{subject_full_name}"
         try:
-            all_files = list(db.collection('uploaded_files').stream())
-            subject_files = []
-            
-            for doc in all_files:
-                file_data = doc.to_dict()
-                if file_data.get('verified', False):
-                    if file_data.get('subject') == subject_full_name:
-                        subject_files.append((doc.id, file_data))
+            if page_key not in st.session_state:
+                files, cursor = FirebaseOps.get_verified_files(subject_full_name, fields=DOWNLOAD_FIELDS, page_size=DOWNLOAD_PAGE_SIZE)
+                st.session_state[page_key] = {'files': files, 'cursor': cursor}
+            subject_files = st.session_state[page_key]['files']
         except Exception as e:
             st.error(f"Error loading files: {e}")
             subject_files = []
@@ -173,7 +164,10 @@ def render_dashboard():
         if len(subject_files) == 0:
             st.info(f"📭 No resources available for download yet. Upload some materials to get started!")
         else:
-            st.success(f"✨ Found {len(subject_files)} resources!")
+            if st.session_state[page_key]['cursor'] is not None:
+                st.success(f"✨ Showing the newest {len(subject_files)} resources!")
+            else:
+                st.success(f"✨ Found {len(subject_files)} resources!")
             
             for doc_id, file_data in subject_files:
                 col1, col2, col3 = st.columns([3, 1, 1])
@@ -211,9 +205,24 @@ def render_dashboard():
                         st.warning("No file available")
                 
                 st.markdown("---")
+            
+            if st.session_state[page_key]['cursor'] is not None:
+                if st.button("⬇️ Load more", key="download_load_more"):
+                    try:
+                        files, cursor = FirebaseOps.get_verified_files(
+                            subject_full_name,
+                            fields=DOWNLOAD_FIELDS,
+                            page_size=DOWNLOAD_PAGE_SIZE,
+                            start_after=st.session_state[page_key]['cursor']
+                        )
+                        st.session_state[page_key] = {'files': subject_files + files, 'cursor': cursor}
+                    except Exception as e:
+                        st.error(f"Error loading files: {e}")
+                    st.rerun()
         
         if st.button("← Back to Subjects", key="close_download"):
             st.session_state.download_subject = None
+            st.session_state.pop(page_key, None)
             st.rerun()
         
         st.stop()  # Prevent rendering rest of dashboard
@@ -243,43 +252,48 @@ def render_dashboard():
         
         if st.button("✨ Upload Files", type="primary", use_container_width=True, key="upload_btn"):
             try:
-                with st.spinner("Uploading files to Firebase and Qdrant..."):
+                IngestionQueue.start()
+                
+                with st.spinner("Uploading files to Firebase..."):
                     user_id = st.session_state.user['id']
                     
+                    if 'ingest_jobs' not in st.session_state:
+                        st.session_state.ingest_jobs = {}
+                    
+                    progress_bar = st.progress(0)
                     success_count = 0
-                    for file in uploaded_files:
+                    done_count = 0
+                    
+                    # Storage uploads and Firestore writes overlap across files;
+                    # each file is queued for AI indexing as soon as it lands
+                    files = [(file.name, file.getvalue()) for file in uploaded_files]
+                    for file_name, file_bytes, result, file_error in FirebaseOps.save_uploaded_files(user_id, files, upload_subject):
+                        done_count += 1
+                        progress_bar.progress(done_count / len(files))
+                        
+                        if file_error or not result:
+                            st.error(f"Failed to upload {file_name}: {str(file_error)}")
+                            continue
+                        
                         try:
-                            file_bytes = file.getvalue()
+                            doc_id = result[1].id
                             
-                            # Save to Firebase Storage + Firestore
-                            result = FirebaseOps.save_uploaded_file(
-                                user_id,
-                                file.name,
-                                file_bytes,
-                                upload_subject
+                            # Qdrant ingestion runs in the background
+                            IngestionQueue.enqueue(
+                                doc_id=doc_id,
+                                file_name=file_name,
+                                subject=upload_subject,
+                                user_id=user_id,
+                                file_content=file_bytes
                             )
+                            st.session_state.ingest_jobs[doc_id] = file_name
+                            
+                            st.write(f"✅ {file_name} uploaded")
+                            success_count += 1
+                            MetricsTracker.track_upload()
                             
-                            if result:
-                                doc_id = result[1].id
-                                
-                                # Upload to Qdrant for RAG
-                                with st.spinner(f"Processing {file.name} for AI search..."):
-                                    chunks_uploaded = QdrantRAG.upload_document_to_qdrant(
-                                        file_name=file.name,
-                                        file_content=file_bytes,
-                                        subject=upload_subject,
-                                        user_id=user_id,
-                                        doc_id=doc_id
-                                    )
-                                    
-                                    if chunks_uploaded > 0:
-                                        st.success(f"✅ {file.name}: Uploaded {chunks_uploaded} chunks to AI database")
-                                
-                                success_count += 1
-                                MetricsTracker.track_upload()
-                                
                         except Exception as file_error:
-                            st.error(f"Failed to upload {file.name}: {str(file_error)}")
+                            st.error(f"Failed to queue {file_name}: {str(file_error)}")
                     
                     if success_count > 0:
                         st.success(f"✨ Successfully uploaded {success_count}/{len(uploaded_files)} files!")
@@ -290,4 +304,59 @@ def render_dashboard():
                         
             except Exception as e:
                 st.error(f"Upload error: {str(e)}")
-                st.exception(e)
\ No newline at end of file
+                st.exception(e)
+    
+    render_ingestion_status()
+
+def render_ingestion_status():
+    """Show background AI-indexing progress for this session's uploads"""
+    jobs = st.session_state.get('ingest_jobs')
+    if not jobs:
+        return
+    
+    # Make sure workers are running (e.g. after a server restart)
+    IngestionQueue.start()
+    
+    st.markdown("### 🤖 AI Indexing Progress")
+    
+    # Finished jobs don't change again - only poll Firestore for the active ones
+    finished = st.session_state.setdefault('ingest_finished', {})
+    active_ids = [doc_id for doc_id in jobs if doc_id not in finished]
+    statuses = IngestionQueue.get_statuses(active_ids) if active_ids else {}
+    for doc_id, file_data in statuses.items():
+        if file_data.get('ingest_status') in (IngestionQueue.INDEXED, IngestionQueue.FAILED):
+            finished[doc_id] = file_data
+    statuses.update(finished)
+    
+    status_labels = {
+        IngestionQueue.QUEUED: "⏳ Queued",
+        IngestionQueue.EXTRACTING: "📖 Extracting text",
+        IngestionQueue.EMBEDDING: "🧠 Embedding",
+        IngestionQueue.INDEXED: "✅ Indexed",
+        IngestionQueue.FAILED: "❌ Failed",
+    }
+    
+    all_done = True
+    for doc_id, file_name in jobs.items():
+        file_data = statuses.get(doc_id, {})
+        status = file_data.get('ingest_status', IngestionQueue.QUEUED)
+        label = status_labels.get(status, status)
+        
+        if status == IngestionQueue.INDEXED:
+            label += f" ({file_data.get('ingest_chunks', 0)} chunks, {file_data.get('ingest_chunks_per_sec', 0):.1f} chunks/sec)"
+        elif status == IngestionQueue.FAILED:
+            label += f" - {file_data.get('ingest_error', 'Unknown error')}"
+        else:
+            all_done = False
+        
+        st.write(f"📄 **{file_name}**: {label}")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if not all_done and st.button("🔄 Refresh status", key="refresh_ingest", use_container_width=True):
+            st.rerun()
+    with col2:
+        if all_done and st.button("✔️ Clear", key="clear_ingest", use_container_width=True):
+            st.session_state.ingest_jobs = {}
+            st.session_state.ingest_finished = {}
+            st.rerun()
@@ -0,0 +1 @@
+# Present so pytest puts the project root on sys.path and tests can import utils/
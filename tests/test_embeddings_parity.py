@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("tokenizers")
+pytest.importorskip("huggingface_hub")
+
+from utils.embeddings import load_backend
+
+# Lowest acceptable cosine similarity between ONNX and PyTorch vectors
+MIN_COSINE = 0.98
+
+TEXTS = [
+    "Newton's second law states that force equals mass times acceleration.",
+    "Q3 2022 past paper: explain the causes of inflation.",
+    "Photosynthesis converts light energy into chemical energy.",
+    "short",
+]
+
+def test_onnx_matches_torch():
+    reference = load_backend('torch').encode(TEXTS)
+    candidate = load_backend('onnx').encode(TEXTS)
+
+    assert reference.shape == candidate.shape == (len(TEXTS), 384)
+
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    lowest = float(np.min(np.sum(reference * candidate, axis=1)))
+    assert lowest >= MIN_COSINE, f"ONNX vectors differ from PyTorch (lowest cosine {lowest:.4f})"
@@ -0,0 +1,101 @@
+import os
+import random
+import time
+import numpy as np
+
+# Default to embedded in-memory Qdrant so no network or cloud quota is needed
+os.environ.setdefault("QDRANT_MODE", "memory")
+
+from utils.qdrant_ops import QdrantRAG
+
+WORDS = (
+    "force mass acceleration energy momentum velocity inflation market demand supply "
+    "photosynthesis cell enzyme equation integral derivative matrix vector profit revenue "
+    "cost entrepreneur strategy circuit voltage current resistance wave frequency"
+).split()
+
+def make_document(word_count, seed):
+    """Build a synthetic study document"""
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(word_count)).encode()
+
+def benchmark_rag(documents=5, words_per_document=5000, queries=50, subject="Benchmark (CI)"):
+    """Time ingestion and search against the configured (by default in-memory) Qdrant"""
+    print(f"Qdrant mode: {QdrantRAG.get_connection_config()['mode']}")
+
+    total_chunks = 0
+    start = time.perf_counter()
+    for idx in range(documents):
+        total_chunks += QdrantRAG.upload_document_to_qdrant(
+            file_name=f"bench_{idx}.txt",
+            file_content=make_document(words_per_document, idx),
+            subject=subject,
+            user_id="benchmark",
+            doc_id=f"bench_doc_{idx}"
+        )
+    ingest_seconds = time.perf_counter() - start
+    print(f"Ingested {total_chunks} chunks in {ingest_seconds:.2f}s "
+          f"({total_chunks / max(ingest_seconds, 1e-9):.1f} chunks/sec)")
+
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(queries):
+        query = " ".join(rng.choice(WORDS) for _ in range(6))
+        start = time.perf_counter()
+        QdrantRAG.search_documents(query, subject, limit=5)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(f"Search over {queries} queries: "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms")
+
+def quantize_int8(vectors, quantile=0.99):
+    """Scalar int8 quantization in the same spirit as Qdrant's (quantile-clipped linear scale)"""
+    low = np.quantile(vectors, 1 - quantile)
+    high = np.quantile(vectors, quantile)
+    scale = (high - low) / 255.0
+    codes = np.clip(np.round((vectors - low) / scale), 0, 255).astype(np.uint8)
+    return codes.astype(np.float32) * scale + low
+
+def benchmark_quantization(documents=20, words_per_document=5000, queries=100, k=5, oversampling=2.0):
+    """
+    Compare top-k recall and vector memory for float32 vs int8 vectors,
+    with and without rescoring, using real embeddings of synthetic chunks.
+    """
+    texts = []
+    for idx in range(documents):
+        words = make_document(words_per_document, idx).decode().split()
+        texts.extend(" ".join(words[i:i + 150]) for i in range(0, len(words), 150))
+    vectors = QdrantRAG.get_embeddings_batch(texts)
+
+    rng = random.Random(1)
+    query_vectors = QdrantRAG.get_embeddings_batch([
+        " ".join(rng.choice(WORDS) for _ in range(6)) for _ in range(queries)
+    ])
+
+    exact = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+    approx_scores = query_vectors @ quantize_int8(vectors).T
+
+    plain = np.argsort(-approx_scores, axis=1)[:, :k]
+
+    # Rescoring: take oversampled int8 candidates, re-rank them with float32 vectors
+    candidates = np.argsort(-approx_scores, axis=1)[:, :int(k * oversampling)]
+    rescored = np.array([
+        row[np.argsort(-(vectors[row] @ q))][:k]
+        for row, q in zip(candidates, query_vectors)
+    ])
+
+    def recall(found):
+        return np.mean([len(set(a) & set(b)) / k for a, b in zip(found, exact)])
+
+    count, dim = vectors.shape
+    print(f"{count} vectors x {dim} dims, top-{k}, {queries} queries")
+    print(f"float32:          recall 1.000, vectors in RAM {count * dim * 4 / 1e6:.2f} MB")
+    print(f"int8:             recall {recall(plain):.3f}, vectors in RAM {count * dim / 1e6:.2f} MB")
+    print(f"int8 + rescoring: recall {recall(rescored):.3f}, vectors in RAM {count * dim / 1e6:.2f} MB "
+          f"(float32 originals on disk - qdrant.vectors_on_disk, default with int8)")
+
+if __name__ == "__main__":
+    benchmark_rag()
+    benchmark_quantization()
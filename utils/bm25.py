@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens, so 'Q3 2022' -> ['q3', '2022']"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Small in-memory BM25 inverted index over chunk text for one collection"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}   # term -> {point_id: term frequency}
+        self.lengths = {}    # point_id -> token count
+        self.chunks = {}     # point_id -> {'doc_id', 'file_name', 'text'}
+        self.total_length = 0
+        self.lock = threading.Lock()
+        # Serialises save() so concurrent writers never interleave on disk
+        self.save_lock = threading.Lock()
+
+    def add_document(self, doc_id, chunks):
+        """Index chunks of one document, replacing any previous version of it"""
+        with self.lock:
+            self._remove_document(doc_id)
+            self._add_chunks(doc_id, chunks)
+
+    def _add_chunks(self, doc_id, chunks):
+        for point_id, text, file_name in chunks:
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[point_id] = tf
+            length = sum(counts.values())
+            self.lengths[point_id] = length
+            self.total_length += length
+            self.chunks[point_id] = {'doc_id': doc_id, 'file_name': file_name, 'text': text}
+
+    def remove_document(self, doc_id):
+        """Drop every chunk of a document from the index"""
+        with self.lock:
+            self._remove_document(doc_id)
+
+    def _remove_document(self, doc_id):
+        stale = [pid for pid, chunk in self.chunks.items() if chunk['doc_id'] == doc_id]
+        if not stale:
+            return
+        stale_set = set(stale)
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for pid in stale_set.intersection(posting):
+                del posting[pid]
+            if not posting:
+                del self.postings[term]
+        for pid in stale:
+            self.total_length -= self.lengths.pop(pid, 0)
+            del self.chunks[pid]
+
+    def search(self, query, limit=10, file_names=None, doc_ids=None):
+        """
+        Return up to `limit` hits as dicts with id, text, file_name, score and
+        coverage (fraction of distinct query terms found in the chunk).
+        """
+        terms = set(tokenize(query))
+        with self.lock:
+            chunk_count = len(self.lengths)
+            if not terms or not chunk_count:
+                return []
+
+            avg_length = self.total_length / chunk_count
+            scores = Counter()
+            matched = Counter()
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (chunk_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pid, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[pid] / avg_length)
+                    scores[pid] += idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[pid] += 1
+
+            hits = []
+            for pid, score in scores.most_common():
+                chunk = self.chunks[pid]
+                if file_names and chunk['file_name'] not in file_names:
+                    continue
+                if doc_ids and chunk['doc_id'] not in doc_ids:
+                    continue
+                hits.append({
+                    'id': pid,
+                    'text': chunk['text'],
+                    'file_name': chunk['file_name'],
+                    'score': score,
+                    'coverage': matched[pid] / len(terms)
+                })
+                if len(hits) >= limit:
+                    break
+            return hits
+
+    def save(self, path):
+        """Persist the index as JSON (written to a unique temp file, then atomically replaced)"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        
+        with self.save_lock:
+            with self.lock:
+                data = {'k1': self.k1, 'b': self.b, 'chunks': dict(self.chunks)}
+            
+            # Unique temp name so other processes saving the same index can't collide
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                json.dump(data, f)
+            try:
+                os.replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+
+    @staticmethod
+    def load(path):
+        """Load an index saved with save(); postings are rebuilt from chunk text"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        index = BM25Index(k1=data.get('k1', 1.5), b=data.get('b', 0.75))
+        by_doc = {}
+        for pid, chunk in data.get('chunks', {}).items():
+            by_doc.setdefault(chunk['doc_id'], []).append((pid, chunk['text'], chunk['file_name']))
+        for doc_id, chunks in by_doc.items():
+            index._add_chunks(doc_id, chunks)
+        return index
@@ -0,0 +1,85 @@
+import re
+from utils.bm25 import tokenize
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+_encoder = None
+
+def count_tokens(text):
+    """Count tokens with tiktoken when installed, else estimate ~4 characters per token"""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return max(1, len(text) // 4)
+
+def split_sentences(text):
+    """Split chunk text into sentences (or paragraphs when there is no punctuation)"""
+    return [s.strip() for s in SENTENCE_PATTERN.split(text) if s.strip()]
+
+def trim_to_budget(query_terms, text, budget):
+    """Keep the sentences that best match the query, in original order, within budget tokens"""
+    if count_tokens(text) <= budget:
+        return text
+
+    sentences = split_sentences(text)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_terms.intersection(tokenize(sentences[i]))), i)
+    )
+
+    chosen = []
+    seen = set()
+    used = 0
+    for i in ranked:
+        cost = count_tokens(sentences[i])
+        if used + cost > budget or sentences[i] in seen:
+            continue
+        chosen.append(i)
+        seen.add(sentences[i])
+        used += cost
+
+    if not chosen and ranked:
+        # Even the best sentence is too long - cut it down
+        return sentences[ranked[0]][:budget * 4]
+
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+def pack_context(query, documents, token_budget=1500, min_score=0.0):
+    """
+    Build the prompt context from retrieved chunks within a token budget.
+    Hits scoring below min_score are dropped (the best hit is always kept) and
+    long chunks are cut down to their most query-relevant sentences.
+    Returns (context, documents_used).
+    """
+    if not documents:
+        return "", []
+
+    kept = [doc for doc in documents if doc.get('score', 0) >= min_score] or documents[:1]
+    query_terms = set(tokenize(query))
+
+    parts = []
+    used_documents = []
+    remaining = token_budget
+    for position, doc in enumerate(kept):
+        header = f"Source: {doc['file_name']}\n"
+        # Split what is left evenly; budget unused by short chunks rolls forward
+        share = remaining // (len(kept) - position) - count_tokens(header)
+        if share <= 0:
+            break
+
+        text = trim_to_budget(query_terms, doc['text'], share)
+        if not text:
+            continue
+
+        block = header + text
+        parts.append(block)
+        used_documents.append(doc)
+        remaining -= count_tokens(block)
+
+    return "\n\n".join(parts), used_documents
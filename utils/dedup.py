@@ -0,0 +1,54 @@
+import numpy as np
+
+def select_diverse(vectors, relevance, limit, threshold=0.95, mmr_lambda=None):
+    """
+    Pick up to `limit` row indices from `vectors`, skipping near-duplicates.
+
+    Rows are taken in order of relevance; a row whose cosine similarity to an
+    already selected row is >= threshold is dropped. With mmr_lambda set,
+    selection uses Maximal Marginal Relevance instead:
+    lambda * relevance - (1 - lambda) * max similarity to the selection.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    count = len(vectors)
+    if count == 0:
+        return []
+
+    # Pairwise cosine similarity in one matrix product
+    normed = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    similarity = normed @ normed.T
+
+    selected = []
+    # Highest similarity of each candidate to anything selected so far
+    max_sim = np.full(count, -np.inf, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+
+    while len(selected) < limit and available.any():
+        if mmr_lambda is None or not selected:
+            scores = relevance
+        else:
+            scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_sim
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+        # Drop everything that is a near-copy of what we just took
+        available &= max_sim < threshold
+
+    return selected
+
+def dedupe_by_text(hits, limit):
+    """Drop hits whose whitespace-normalised text was already seen"""
+    seen = set()
+    unique = []
+    for hit in hits:
+        key = " ".join(hit["text"].split()).lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(hit)
+        if len(unique) >= limit:
+            break
+    return unique
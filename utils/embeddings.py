@@ -0,0 +1,83 @@
+import numpy as np
+
+# Hugging Face repo that ships both the PyTorch and ONNX exports of the model
+MODEL_REPO = 'sentence-transformers/all-MiniLM-L6-v2'
+
+class SentenceTransformerBackend:
+    """PyTorch sentence-transformers backend (default)"""
+
+    name = 'torch'
+
+    def __init__(self, model_name='all-MiniLM-L6-v2'):
+        # Imported here so the ONNX backend never loads torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        """Encode a string or list of strings into 384-d vectors"""
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=convert_to_numpy,
+            show_progress_bar=show_progress_bar
+        )
+
+class OnnxEmbeddingBackend:
+    """ONNX Runtime backend for the same model, using the int8-quantized export by default"""
+
+    name = 'onnx'
+
+    def __init__(self, model_file='onnx/model_quint8_avx2.onnx', max_length=256, threads=0):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(MODEL_REPO, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token='[PAD]')
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            hf_hub_download(MODEL_REPO, model_file),
+            sess_options=options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts):
+        """Tokenize, run the model, mean-pool and L2-normalise (same as the sentence-transformers pipeline)"""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            inputs['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        """Encode a string or list of strings into 384-d vectors"""
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        batches = [
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), max(1, batch_size))
+        ]
+        embeddings = np.vstack(batches) if batches else np.zeros((0, 384), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+def load_backend(backend='torch', model_name='all-MiniLM-L6-v2', **options):
+    """Create the embedding backend selected in settings"""
+    if backend == 'onnx':
+        return OnnxEmbeddingBackend(**options)
+    return SentenceTransformerBackend(model_name)
@@ -1,12 +1,25 @@
 from datetime import datetime
 from config.firebase_config import db
 import streamlit as st
-from firebase_admin import storage
+from firebase_admin import storage, firestore
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.cache import TTLCache
+from utils.interaction_logger import InteractionLogger
 
 class FirebaseOps:
     """Handle all Firebase database operations"""
     
+    # Process-wide copy of the subjects collection, kept fresh by a snapshot listener
+    _subjects = []
+    _subjects_watch = None
+    _subjects_lock = threading.Lock()
+    _subjects_ready = threading.Event()
+    
+    # Approved file listings per subject, shared by all sessions (dropped on approve/delete)
+    _verified_files_cache = TTLCache(maxsize=256, ttl=60)
+    
     @staticmethod
     def create_user_session(user_id, email):
         """Track user login session"""
@@ -22,14 +35,14 @@ class FirebaseOps:
     
     @staticmethod
     def log_interaction(user_id, event_type, metadata=None):
-        """Log user interactions for metrics tracking"""
+        """Log user interactions for metrics tracking (buffered, written in the background)"""
         interaction = {
             'user_id': user_id,
             'event_type': event_type,
             'timestamp': datetime.now(),
             'metadata': metadata or {}
         }
-        db.collection('interactions').add(interaction)
+        InteractionLogger.log(interaction)
     
     @staticmethod
     def track_session_duration(session_doc_id, duration_seconds):
@@ -43,40 +56,254 @@ class FirebaseOps:
             # If document doesn't exist, just log the error and continue
             print(f"Could not update session: {e}")
     
+    @staticmethod
+    def _save_uploaded_file(user_id, file_name, file_data, subject):
+        """Upload to Storage and write metadata, raising on failure"""
+        # Generate unique file path
+        file_id = str(uuid.uuid4())
+        storage_path = f"uploads/{subject}/{file_id}_{file_name}"
+        
+        # Upload to Firebase Storage
+        bucket = storage.bucket()
+        blob = bucket.blob(storage_path)
+        blob.upload_from_string(file_data, content_type='application/octet-stream')
+        
+        # Make file publicly accessible (or use signed URLs for private access)
+        blob.make_public()
+        download_url = blob.public_url
+        
+        # Save metadata to Firestore
+        file_doc = {
+            'user_id': user_id,
+            'file_name': file_name,
+            'subject': subject,
+            'upload_time': datetime.now(),
+            'file_size': len(file_data),
+            'verified': False,
+            'storage_path': storage_path,
+            'download_url': download_url
+        }
+        
+        # Metadata and the subject's pending counter are written atomically
+        doc_ref = db.collection('uploaded_files').document()
+        batch = db.batch()
+        batch.set(doc_ref, file_doc)
+        FirebaseOps._bump_subject_stats(batch, subject, total=1, pending=1)
+        write_results = batch.commit()
+        return write_results[0].update_time, doc_ref
+    
     @staticmethod
     def save_uploaded_file(user_id, file_name, file_data, subject):
         """Store uploaded file to Firebase Storage and save metadata"""
         try:
-            # Generate unique file path
-            file_id = str(uuid.uuid4())
-            storage_path = f"uploads/{subject}/{file_id}_{file_name}"
-            
-            # Upload to Firebase Storage
-            bucket = storage.bucket()
-            blob = bucket.blob(storage_path)
-            blob.upload_from_string(file_data, content_type='application/octet-stream')
-            
-            # Make file publicly accessible (or use signed URLs for private access)
-            blob.make_public()
-            download_url = blob.public_url
-            
-            # Save metadata to Firestore
-            file_doc = {
-                'user_id': user_id,
-                'file_name': file_name,
-                'subject': subject,
-                'upload_time': datetime.now(),
-                'file_size': len(file_data),
-                'verified': False,
-                'storage_path': storage_path,
-                'download_url': download_url
-            }
-            return db.collection('uploaded_files').add(file_doc)
-            
+            return FirebaseOps._save_uploaded_file(user_id, file_name, file_data, subject)
         except Exception as e:
             st.error(f"Error uploading file: {e}")
             return None
     
+    @staticmethod
+    def save_uploaded_files(user_id, files, subject, max_workers=4):
+        """
+        Upload several (file_name, file_data) pairs concurrently.
+        Yields (file_name, file_data, result, error) as each file finishes.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(FirebaseOps._save_uploaded_file, user_id, file_name, file_data, subject): (file_name, file_data)
+                for file_name, file_data in files
+            }
+            for future in as_completed(futures):
+                file_name, file_data = futures[future]
+                try:
+                    yield file_name, file_data, future.result(), None
+                except Exception as e:
+                    yield file_name, file_data, None, e
+    
+    @staticmethod
+    def _subject_stats_ref(subject):
+        """subject_stats document for a subject ('/' is not allowed in document IDs)"""
+        return db.collection('subject_stats').document(subject.replace('/', '_'))
+    
+    @staticmethod
+    def _bump_subject_stats(writer, subject, total=0, verified=0, pending=0):
+        """Add increments to a subject's counters inside a batch or transaction"""
+        if not subject:
+            return
+        writer.set(FirebaseOps._subject_stats_ref(subject), {
+            'subject': subject,
+            'total': firestore.Increment(total),
+            'verified': firestore.Increment(verified),
+            'pending': firestore.Increment(pending),
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }, merge=True)
+    
+    @staticmethod
+    def set_file_verified(doc_id, verified=True):
+        """
+        Approve (or un-approve) an uploaded file and move it between the
+        pending/verified counters in one transaction. Returns the file's data,
+        or None if it no longer exists.
+        """
+        file_ref = db.collection('uploaded_files').document(doc_id)
+        
+        @firestore.transactional
+        def apply(transaction):
+            snapshot = file_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            
+            file_data = snapshot.to_dict()
+            if bool(file_data.get('verified', False)) != verified:
+                update = {'verified': verified}
+                if verified:
+                    update['approved_at'] = datetime.now()
+                transaction.update(file_ref, update)
+                step = 1 if verified else -1
+                FirebaseOps._bump_subject_stats(transaction, file_data.get('subject'), verified=step, pending=-step)
+            return file_data
+        
+        file_data = apply(db.transaction())
+        if file_data:
+            FirebaseOps.invalidate_file_listings(file_data.get('subject'))
+        return file_data
+    
+    @staticmethod
+    def delete_uploaded_file(doc_id):
+        """
+        Delete an uploaded file's metadata and decrement its subject's counters
+        in one transaction. Returns the deleted file's data, or None.
+        """
+        file_ref = db.collection('uploaded_files').document(doc_id)
+        
+        @firestore.transactional
+        def apply(transaction):
+            snapshot = file_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return None
+            
+            file_data = snapshot.to_dict()
+            transaction.delete(file_ref)
+            if file_data.get('verified', False):
+                FirebaseOps._bump_subject_stats(transaction, file_data.get('subject'), total=-1, verified=-1)
+            else:
+                FirebaseOps._bump_subject_stats(transaction, file_data.get('subject'), total=-1, pending=-1)
+            return file_data
+        
+        file_data = apply(db.transaction())
+        if file_data:
+            FirebaseOps.invalidate_file_listings(file_data.get('subject'))
+        return file_data
+    
+    @staticmethod
+    def get_verified_files(subject, fields=None, page_size=50, start_after=None):
+        """
+        One page of a subject's approved files, newest first, as (doc_id, data) pairs.
+        Served by the (subject, verified, upload_time) composite index in
+        firestore.indexes.json; `fields` limits which fields are fetched.
+        Returns (files, cursor) - pass cursor as start_after to get the next
+        page; it is None on the last page.
+        """
+        query = db.collection('uploaded_files') \
+            .where(field_path='subject', op_string='==', value=subject) \
+            .where(field_path='verified', op_string='==', value=True) \
+            .order_by('upload_time', direction=firestore.Query.DESCENDING)
+        
+        if fields:
+            # The cursor is built from upload_time, so it is always fetched
+            query = query.select(sorted(set(fields) | {'upload_time'}))
+        if start_after is not None:
+            query = query.start_after(start_after)
+        
+        docs = list(query.limit(page_size).stream())
+        cursor = docs[-1] if len(docs) == page_size else None
+        return [(doc.id, doc.to_dict()) for doc in docs], cursor
+    
+    @staticmethod
+    def list_verified_files(subject, fields=None, page_size=100):
+        """All of a subject's approved files, paged through the index and cached briefly"""
+        key = (subject, tuple(sorted(fields)) if fields else None)
+        files = FirebaseOps._verified_files_cache.get(key)
+        if files is None:
+            files = []
+            cursor = None
+            while True:
+                page, cursor = FirebaseOps.get_verified_files(subject, fields, page_size, cursor)
+                files.extend(page)
+                if cursor is None:
+                    break
+            FirebaseOps._verified_files_cache.set(key, files)
+        return list(files)
+    
+    @staticmethod
+    def invalidate_file_listings(subject=None):
+        """Drop cached approved-file listings for a subject (or all subjects)"""
+        if subject is None:
+            FirebaseOps._verified_files_cache.invalidate(lambda key: True)
+        else:
+            FirebaseOps._verified_files_cache.invalidate(lambda key: key[0] == subject)
+    
+    # Marker document written by rebuild_subject_stats; its absence means the counters were never built
+    SUBJECT_STATS_META = '_meta'
+    
+    @staticmethod
+    def get_subject_stats():
+        """
+        Return {subject: {'total', 'verified', 'pending'}} from the subject_stats
+        counters, building them first if they have never been rebuilt.
+        """
+        stats = {}
+        initialised = False
+        for doc in db.collection('subject_stats').stream():
+            if doc.id == FirebaseOps.SUBJECT_STATS_META:
+                initialised = True
+                continue
+            data = doc.to_dict()
+            stats[data.get('subject', doc.id)] = data
+        
+        if not initialised:
+            # Counters written since deploy only cover some subjects - recount everything once
+            return FirebaseOps.rebuild_subject_stats()
+        return stats
+    
+    @staticmethod
+    def rebuild_subject_stats():
+        """
+        Recount subject_stats from uploaded_files (fixes drift, e.g. after
+        manual edits in the console). Returns the new {subject: counts}.
+        """
+        counts = {}
+        files = db.collection('uploaded_files').select(['subject', 'verified']).stream()
+        for doc in files:
+            data = doc.to_dict()
+            subject = data.get('subject')
+            if not subject:
+                continue
+            entry = counts.setdefault(subject, {'subject': subject, 'total': 0, 'verified': 0, 'pending': 0})
+            entry['total'] += 1
+            entry['verified' if data.get('verified', False) else 'pending'] += 1
+        
+        # Firestore batches hold at most 500 writes
+        writes = [(FirebaseOps._subject_stats_ref(subject), entry) for subject, entry in counts.items()]
+        writes += [
+            (doc.reference, None)
+            for doc in db.collection('subject_stats').stream()
+            if doc.id != FirebaseOps.SUBJECT_STATS_META and doc.to_dict().get('subject', doc.id) not in counts
+        ]
+        for start in range(0, len(writes), 500):
+            batch = db.batch()
+            for ref, entry in writes[start:start + 500]:
+                if entry is None:
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, {**entry, 'updated_at': firestore.SERVER_TIMESTAMP})
+            batch.commit()
+        
+        db.collection('subject_stats').document(FirebaseOps.SUBJECT_STATS_META).set({
+            'rebuilt_at': firestore.SERVER_TIMESTAMP,
+            'subjects': len(counts)
+        })
+        return counts
+    
     @staticmethod
     def get_file_download_url(doc_id):
         """Get download URL for a file"""
@@ -109,4 +336,51 @@ class FirebaseOps:
             return len(interactions)
         except Exception as e:
             st.error(f"Error getting stats: {e}")
-            return 0
\ No newline at end of file
+            return 0
+    
+    @staticmethod
+    def _on_subjects_snapshot(docs, changes, read_time):
+        """Listener callback: replace the cached subjects with the latest snapshot"""
+        FirebaseOps._subjects = [(doc.id, doc.to_dict()) for doc in docs]
+        FirebaseOps._subjects_ready.set()
+    
+    @staticmethod
+    def start_subjects_listener():
+        """Start (or restart, if it died) the Firestore listener on the subjects collection"""
+        with FirebaseOps._subjects_lock:
+            watch = FirebaseOps._subjects_watch
+            if watch is not None and not getattr(watch, '_closed', False):
+                return True
+            
+            try:
+                FirebaseOps._subjects_ready.clear()
+                FirebaseOps._subjects_watch = db.collection('subjects').on_snapshot(FirebaseOps._on_subjects_snapshot)
+                return True
+            except Exception as e:
+                print(f"Could not start subjects listener: {e}")
+                FirebaseOps._subjects_watch = None
+                return False
+    
+    @staticmethod
+    def stop_subjects_listener():
+        """Unsubscribe the subjects listener (e.g. on shutdown)"""
+        with FirebaseOps._subjects_lock:
+            if FirebaseOps._subjects_watch is not None:
+                try:
+                    FirebaseOps._subjects_watch.unsubscribe()
+                except Exception:
+                    pass
+            FirebaseOps._subjects_watch = None
+            FirebaseOps._subjects_ready.clear()
+    
+    @staticmethod
+    def get_subjects(timeout=5):
+        """
+        Return the subjects collection as (doc_id, data) pairs, served from memory.
+        The first call starts the listener and waits up to `timeout` seconds for
+        its initial snapshot; if the listener is unavailable the collection is
+        read directly.
+        """
+        if FirebaseOps.start_subjects_listener() and FirebaseOps._subjects_ready.wait(timeout):
+            return list(FirebaseOps._subjects)
+        return [(doc.id, doc.to_dict()) for doc in db.collection('subjects').stream()]
@@ -1,6 +1,5 @@
 import streamlit as st
-from qdrant_client import QdrantClient
-from qdrant_client.models import PayloadSchemaType
+from utils.qdrant_ops import QdrantRAG
 
 def fix_qdrant_indexes():
     """Add missing payload indexes to all existing Qdrant collections"""
@@ -9,11 +8,10 @@ def fix_qdrant_indexes():
     st.write("This will add missing payload indexes to your existing Qdrant collections")
     
     try:
-        # Get Qdrant client
-        client = QdrantClient(
-            url=st.secrets["qdrant"]["url"],
-            api_key=st.secrets["qdrant"]["api_key"]
-        )
+        # Get shared Qdrant client
+        client = QdrantRAG.get_client()
+        if not client:
+            return
         
         # Get all collections
         collections = client.get_collections().collections
@@ -32,47 +30,20 @@ def fix_qdrant_indexes():
                 
                 try:
                     # Try to create indexes (will skip if they already exist)
-                    try:
-                        client.create_payload_index(
-                            collection_name=collection_name,
-                            field_name="file_name",
-                            field_schema=PayloadSchemaType.KEYWORD
-                        )
-                        st.success(f"✅ Added file_name index to {collection_name}")
-                        fixed_count += 1
-                    except Exception as e:
-                        if "already exists" in str(e).lower():
-                            st.info(f"ℹ️ file_name index already exists in {collection_name}")
-                        else:
-                            st.warning(f"⚠️ Could not add file_name index: {e}")
-                    
-                    try:
-                        client.create_payload_index(
-                            collection_name=collection_name,
-                            field_name="subject",
-                            field_schema=PayloadSchemaType.KEYWORD
-                        )
-                        st.success(f"✅ Added subject index to {collection_name}")
-                        fixed_count += 1
-                    except Exception as e:
-                        if "already exists" in str(e).lower():
-                            st.info(f"ℹ️ subject index already exists in {collection_name}")
-                        else:
-                            st.warning(f"⚠️ Could not add subject index: {e}")
-                    
-                    try:
-                        client.create_payload_index(
-                            collection_name=collection_name,
-                            field_name="doc_id",
-                            field_schema=PayloadSchemaType.KEYWORD
-                        )
-                        st.success(f"✅ Added doc_id index to {collection_name}")
-                        fixed_count += 1
-                    except Exception as e:
-                        if "already exists" in str(e).lower():
-                            st.info(f"ℹ️ doc_id index already exists in {collection_name}")
-                        else:
-                            st.warning(f"⚠️ Could not add doc_id index: {e}")
+                    for field_name, field_schema in QdrantRAG.INDEXED_FIELDS.items():
+                        try:
+                            client.create_payload_index(
+                                collection_name=collection_name,
+                                field_name=field_name,
+                                field_schema=field_schema
+                            )
+                            st.success(f"✅ Added {field_name} index to {collection_name}")
+                            fixed_count += 1
+                        except Exception as e:
+                            if "already exists" in str(e).lower():
+                                st.info(f"ℹ️ {field_name} index already exists in {collection_name}")
+                            else:
+                                st.warning(f"⚠️ Could not add {field_name} index: {e}")
                     
                 except Exception as e:
                     st.error(f"❌ Error processing {collection_name}: {e}")
@@ -0,0 +1,198 @@
+import queue
+import threading
+from datetime import datetime
+import streamlit as st
+from config.firebase_config import db
+from utils.firebase_ops import FirebaseOps
+from utils.qdrant_ops import QdrantRAG
+
+class IngestionQueue:
+    """Background Qdrant ingestion for uploaded files, with job state stored in Firestore"""
+
+    # Job states recorded on the uploaded_files document
+    QUEUED = 'queued'
+    EXTRACTING = 'extracting'
+    EMBEDDING = 'embedding'
+    INDEXED = 'indexed'
+    FAILED = 'failed'
+    ACTIVE_STATES = [QUEUED, EXTRACTING, EMBEDDING]
+
+    # Process-wide queue and worker threads (started once)
+    _jobs = queue.Queue()
+    _workers = []
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start():
+        """Start worker threads and pick up unfinished jobs from Firestore (idempotent)"""
+        with IngestionQueue._lock:
+            if IngestionQueue._workers:
+                return
+
+            worker_count = int(IngestionQueue.get_setting("workers", 2))
+
+            for idx in range(max(1, worker_count)):
+                worker = threading.Thread(
+                    target=IngestionQueue._worker_loop,
+                    name=f"ingest-worker-{idx}",
+                    daemon=True
+                )
+                worker.start()
+                IngestionQueue._workers.append(worker)
+
+        IngestionQueue.recover_jobs()
+
+    @staticmethod
+    def recover_jobs():
+        """Re-queue jobs left unfinished by a previous process or rerun"""
+        try:
+            unfinished = db.collection('uploaded_files').where(
+                field_path='ingest_status', op_string='in', value=IngestionQueue.ACTIVE_STATES
+            ).stream()
+
+            for doc in unfinished:
+                file_data = doc.to_dict()
+                IngestionQueue._jobs.put({
+                    'doc_id': doc.id,
+                    'file_name': file_data.get('file_name', 'Unknown'),
+                    'subject': file_data.get('subject', ''),
+                    'user_id': file_data.get('user_id', ''),
+                    'storage_path': file_data.get('storage_path'),
+                    'verified': file_data.get('verified', False),
+                    'file_content': None
+                })
+        except Exception as e:
+            print(f"Could not recover ingestion jobs: {e}")
+
+    @staticmethod
+    def enqueue(doc_id, file_name, subject, user_id, storage_path=None, file_content=None):
+        """Queue a saved upload for ingestion and mark it as queued"""
+        IngestionQueue.set_status(doc_id, IngestionQueue.QUEUED)
+        IngestionQueue._jobs.put({
+            'doc_id': doc_id,
+            'file_name': file_name,
+            'subject': subject,
+            'user_id': user_id,
+            'storage_path': storage_path,
+            'verified': False,
+            'file_content': file_content
+        })
+
+    @staticmethod
+    def set_status(doc_id, status, **extra):
+        """Record a job state on its uploaded_files document"""
+        try:
+            update = {
+                'ingest_status': status,
+                'ingest_updated_at': datetime.now()
+            }
+            update.update(extra)
+            db.collection('uploaded_files').document(doc_id).update(update)
+        except Exception as e:
+            print(f"Could not update ingestion status for {doc_id}: {e}")
+
+    @staticmethod
+    def get_statuses(doc_ids):
+        """Read the current ingestion state for a list of uploaded_files IDs"""
+        statuses = {}
+        try:
+            refs = [db.collection('uploaded_files').document(doc_id) for doc_id in doc_ids]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    statuses[doc.id] = doc.to_dict()
+        except Exception as e:
+            st.error(f"Error loading upload status: {e}")
+        return statuses
+
+    @staticmethod
+    def get_setting(key, default=None):
+        """Read an optional setting from the [ingestion] section of secrets"""
+        try:
+            return st.secrets.get("ingestion", {}).get(key, default)
+        except Exception:
+            return default
+
+    @staticmethod
+    def _worker_loop():
+        """Take jobs off the queue forever, retrying failed jobs with a growing delay"""
+        while True:
+            job = IngestionQueue._jobs.get()
+            try:
+                IngestionQueue._run_job(job)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                attempts = job.get('attempts', 0) + 1
+                if attempts <= int(IngestionQueue.get_setting("max_retries", 2)):
+                    # Transient failures (Qdrant outage, network) get another go
+                    job['attempts'] = attempts
+                    IngestionQueue.set_status(job['doc_id'], IngestionQueue.QUEUED, ingest_error=f"Retry {attempts}: {error}")
+                    delay = float(IngestionQueue.get_setting("retry_delay", 30)) * attempts
+                    retry = threading.Timer(delay, IngestionQueue._jobs.put, args=(job,))
+                    retry.daemon = True
+                    retry.start()
+                else:
+                    IngestionQueue.set_status(job['doc_id'], IngestionQueue.FAILED, ingest_error=error)
+            finally:
+                IngestionQueue._jobs.task_done()
+
+    @staticmethod
+    def _get_file(doc_id):
+        """Current uploaded_files data for a job, or None if the file was deleted"""
+        doc = db.collection('uploaded_files').document(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    @staticmethod
+    def _run_job(job):
+        """Download (if needed), extract, embed and index one file"""
+        doc_id = job['doc_id']
+
+        # The file may have been rejected or approved since it was queued
+        file_data = IngestionQueue._get_file(doc_id)
+        if file_data is None:
+            return
+        verified = file_data.get('verified', False)
+
+        file_content = job.get('file_content')
+        if file_content is None:
+            if not job.get('storage_path'):
+                IngestionQueue.set_status(doc_id, IngestionQueue.FAILED, ingest_error='No storage path')
+                return
+            file_content = FirebaseOps.download_file_from_storage(job['storage_path'])
+            if file_content is None:
+                # Let the worker loop retry - Storage may be briefly unavailable
+                raise RuntimeError('Could not download file')
+            # Keep the bytes for retries
+            job['file_content'] = file_content
+
+        stats = {}
+        chunks_uploaded = QdrantRAG.upload_document_to_qdrant(
+            file_name=job['file_name'],
+            file_content=file_content,
+            subject=job['subject'],
+            user_id=job['user_id'],
+            doc_id=doc_id,
+            reingest=True,
+            verified=verified,
+            on_stage=lambda stage: IngestionQueue.set_status(doc_id, stage),
+            on_stats=stats.update,
+            raise_errors=True
+        )
+
+        if chunks_uploaded > 0:
+            # Reconcile with admin actions that happened while we were indexing
+            file_data = IngestionQueue._get_file(doc_id)
+            if file_data is None:
+                QdrantRAG.delete_document(job['subject'], doc_id)
+                return
+            if file_data.get('verified', False) != verified:
+                QdrantRAG.set_document_verified(job['subject'], doc_id, file_data.get('verified', False))
+
+            IngestionQueue.set_status(
+                doc_id,
+                IngestionQueue.INDEXED,
+                ingest_chunks=chunks_uploaded,
+                ingest_chunks_per_sec=stats.get('chunks_per_sec', 0.0),
+                ingest_error=None
+            )
+        else:
+            IngestionQueue.set_status(doc_id, IngestionQueue.FAILED, ingest_error='No text could be indexed')
@@ -0,0 +1,150 @@
+import atexit
+import threading
+import time
+from collections import deque
+import streamlit as st
+from config.firebase_config import db
+
+class InteractionLogger:
+    """Write-behind logger: interactions are buffered in memory and written to Firestore in batches"""
+
+    # Firestore allows at most 500 writes per batch
+    MAX_BATCH_SIZE = 500
+
+    # Process-wide buffer and flusher thread (started once)
+    _buffer = deque()
+    _lock = threading.Lock()
+    _wake = threading.Event()
+    _flusher = None
+
+    # Counters shown in the admin panel
+    _stats = {
+        'logged': 0,
+        'written': 0,
+        'dropped': 0,
+        'failed_flushes': 0,
+        'flushes': 0,
+        'last_flush_ms': 0.0,
+        'total_flush_ms': 0.0,
+        'max_queue_delay_ms': 0.0,
+    }
+
+    @staticmethod
+    def get_setting(key, default=None):
+        """Read an optional setting from the [interaction_logging] section of secrets"""
+        try:
+            return st.secrets.get("interaction_logging", {}).get(key, default)
+        except Exception:
+            return default
+
+    @staticmethod
+    def start():
+        """Start the background flusher thread (idempotent)"""
+        with InteractionLogger._lock:
+            if InteractionLogger._flusher is not None:
+                return
+
+            InteractionLogger._flusher = threading.Thread(
+                target=InteractionLogger._flush_loop,
+                name="interaction-logger",
+                daemon=True
+            )
+            InteractionLogger._flusher.start()
+
+        # Write out whatever is still buffered when the process exits
+        atexit.register(InteractionLogger.shutdown)
+
+    @staticmethod
+    def log(interaction):
+        """Queue an interaction document; never touches the network"""
+        InteractionLogger.start()
+        max_buffer = int(InteractionLogger.get_setting("max_buffer", 10000))
+        batch_size = int(InteractionLogger.get_setting("batch_size", 200))
+
+        with InteractionLogger._lock:
+            if len(InteractionLogger._buffer) >= max_buffer:
+                # Firestore is unreachable or too slow - shed load rather than grow unbounded
+                InteractionLogger._stats['dropped'] += 1
+                return False
+            InteractionLogger._buffer.append((time.perf_counter(), interaction))
+            InteractionLogger._stats['logged'] += 1
+            pending = len(InteractionLogger._buffer)
+
+        if pending >= batch_size:
+            InteractionLogger._wake.set()
+        return True
+
+    @staticmethod
+    def _flush_loop():
+        """Flush every flush_interval seconds, or sooner when a full batch is waiting"""
+        while True:
+            interval = float(InteractionLogger.get_setting("flush_interval", 2.0))
+            InteractionLogger._wake.wait(timeout=interval)
+            InteractionLogger._wake.clear()
+            try:
+                InteractionLogger.flush()
+            except Exception as e:
+                print(f"Interaction logger flush failed: {e}")
+                # Back off before retrying the events that were put back
+                time.sleep(interval)
+
+    @staticmethod
+    def flush():
+        """Write all buffered interactions now, in batches; returns the number written"""
+        batch_size = min(int(InteractionLogger.get_setting("batch_size", 200)), InteractionLogger.MAX_BATCH_SIZE)
+        written = 0
+
+        while True:
+            with InteractionLogger._lock:
+                events = [InteractionLogger._buffer.popleft() for _ in range(min(batch_size, len(InteractionLogger._buffer)))]
+            if not events:
+                return written
+
+            start = time.perf_counter()
+            try:
+                batch = db.batch()
+                for _, interaction in events:
+                    batch.set(db.collection('interactions').document(), interaction)
+                batch.commit()
+            except Exception:
+                with InteractionLogger._lock:
+                    InteractionLogger._stats['failed_flushes'] += 1
+                    # Put the events back in order; anything beyond the buffer limit is dropped
+                    room = int(InteractionLogger.get_setting("max_buffer", 10000)) - len(InteractionLogger._buffer)
+                    kept = events[:max(0, room)]
+                    InteractionLogger._buffer.extendleft(reversed(kept))
+                    InteractionLogger._stats['dropped'] += len(events) - len(kept)
+                raise
+
+            finished = time.perf_counter()
+            flush_ms = (finished - start) * 1000
+            with InteractionLogger._lock:
+                stats = InteractionLogger._stats
+                stats['written'] += len(events)
+                stats['flushes'] += 1
+                stats['last_flush_ms'] = flush_ms
+                stats['total_flush_ms'] += flush_ms
+                stats['max_queue_delay_ms'] = max(stats['max_queue_delay_ms'], (finished - events[0][0]) * 1000)
+            written += len(events)
+
+    @staticmethod
+    def flush_soon():
+        """Ask the flusher thread to write the buffer now without waiting for it (e.g. on logout)"""
+        InteractionLogger._wake.set()
+
+    @staticmethod
+    def shutdown():
+        """Final synchronous flush at process exit"""
+        try:
+            InteractionLogger.flush()
+        except Exception as e:
+            print(f"Could not flush interactions on shutdown: {e}")
+
+    @staticmethod
+    def stats():
+        """Return logger counters (buffered, written, dropped, flush latency)"""
+        with InteractionLogger._lock:
+            stats = dict(InteractionLogger._stats)
+            stats['buffered'] = len(InteractionLogger._buffer)
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
@@ -0,0 +1,218 @@
+import queue
+import threading
+import streamlit as st
+
+class LLMClients:
+    """Cached OpenAI/Anthropic clients with per-provider timeouts and hedged fallback"""
+
+    # Clients keyed by (provider, api_key), reused across messages and sessions
+    _clients = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_setting(key, default=None):
+        """Read an optional setting from the [llm] section of secrets"""
+        try:
+            return st.secrets.get("llm", {}).get(key, default)
+        except Exception:
+            return default
+
+    @staticmethod
+    def get_openai_client():
+        """Get a cached OpenAI client, or None if no key is configured"""
+        api_key = st.secrets.get("openai", {}).get("api_key", "")
+        if not (api_key and api_key.startswith("sk-")):
+            return None
+
+        key = ("openai", api_key)
+        with LLMClients._lock:
+            if key not in LLMClients._clients:
+                from openai import OpenAI
+                LLMClients._clients[key] = OpenAI(
+                    api_key=api_key,
+                    timeout=float(LLMClients.get_setting("openai_timeout", 20)),
+                    max_retries=int(LLMClients.get_setting("max_retries", 1))
+                )
+            return LLMClients._clients[key]
+
+    @staticmethod
+    def get_anthropic_client():
+        """Get a cached Anthropic client, or None if no key is configured"""
+        api_key = st.secrets.get("anthropic", {}).get("api_key", "")
+        if not api_key:
+            return None
+
+        key = ("anthropic", api_key)
+        with LLMClients._lock:
+            if key not in LLMClients._clients:
+                import anthropic
+                LLMClients._clients[key] = anthropic.Anthropic(
+                    api_key=api_key,
+                    timeout=float(LLMClients.get_setting("anthropic_timeout", 20)),
+                    max_retries=int(LLMClients.get_setting("max_retries", 1))
+                )
+            return LLMClients._clients[key]
+
+    @staticmethod
+    def stream_openai_answer(query, subject, language, context):
+        """Yield answer tokens from OpenAI (yields nothing if no key is configured)"""
+        client = LLMClients.get_openai_client()
+        if not client:
+            return
+
+        prompt = f"""You are a helpful study assistant. Answer the student's question using ONLY the provided context from their study materials.
+
+Question: {query}
+Subject: {subject}
+Language: {language}
+
+Context from uploaded materials:
+{context}
+
+Instructions:
+1. Answer in {language}
+2. Be clear and concise
+3. Only use information from the context
+4. If the context doesn't contain the answer, say so
+5. Cite which source you're using
+
+Answer:"""
+
+        stream = client.chat.completions.create(
+            model="gpt-4o-mini",  # Cheap: $0.50 per 1M tokens
+            messages=[
+                {"role": "system", "content": "You are a helpful study assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=int(LLMClients.get_setting("max_output_tokens", 500)),
+            temperature=0.7,
+            stream=True
+        )
+
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Release the connection if we stop early (e.g. lost a hedge)
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+    @staticmethod
+    def stream_anthropic_answer(query, subject, language, context):
+        """Yield answer tokens from Anthropic Claude (yields nothing if no key is configured)"""
+        client = LLMClients.get_anthropic_client()
+        if not client:
+            return
+
+        with client.messages.stream(
+            model="claude-3-haiku-20240307",  # Cheapest Claude
+            max_tokens=int(LLMClients.get_setting("max_output_tokens", 500)),
+            messages=[{
+                "role": "user",
+                "content": f"""Answer this question using ONLY the provided context.
+
+Question: {query}
+Language: {language}
+
+Context: {context}
+
+Answer clearly in {language}:"""
+            }]
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+
+    @staticmethod
+    def _run_provider(idx, stream_answer, args, events, cancelled):
+        """Pump one provider's tokens into the shared event queue (runs in a thread)"""
+        tokens = stream_answer(*args)
+        try:
+            for token in tokens:
+                if cancelled.is_set():
+                    return
+                events.put((idx, "token", token))
+            events.put((idx, "done", None))
+        except Exception as e:
+            events.put((idx, "error", e))
+        finally:
+            tokens.close()
+
+    @staticmethod
+    def stream_answer(query, subject, language, context):
+        """
+        Yield answer tokens from the first provider that responds.
+
+        Providers are tried in order (OpenAI, then Anthropic). With
+        llm.hedge_delay set, the next provider is also started if the current
+        one has not produced a token within that many seconds, and whichever
+        answers first wins. Yields nothing if no provider is configured;
+        raises if every configured provider failed.
+        """
+        providers = [
+            ("OpenAI", LLMClients.stream_openai_answer),
+            ("Anthropic", LLMClients.stream_anthropic_answer),
+        ]
+        hedge_delay = LLMClients.get_setting("hedge_delay", None)
+        hedge_delay = float(hedge_delay) if hedge_delay else None
+
+        args = (query, subject, language, context)
+        events = queue.Queue()
+        cancel_flags = []
+        finished = set()
+        errors = []
+
+        def start_next():
+            idx = len(cancel_flags)
+            cancel_flags.append(threading.Event())
+            threading.Thread(
+                target=LLMClients._run_provider,
+                args=(idx, providers[idx][1], args, events, cancel_flags[idx]),
+                daemon=True
+            ).start()
+
+        start_next()
+        winner = None
+        first_token = None
+
+        # Wait for the first token from any running provider
+        while winner is None:
+            can_hedge = len(cancel_flags) < len(providers)
+            try:
+                idx, kind, value = events.get(timeout=hedge_delay if can_hedge else None)
+            except queue.Empty:
+                start_next()
+                continue
+
+            if kind == "token":
+                winner, first_token = idx, value
+                break
+
+            finished.add(idx)
+            if kind == "error":
+                errors.append(f"{providers[idx][0]}: {value}")
+
+            if len(cancel_flags) < len(providers):
+                start_next()
+            elif len(finished) == len(cancel_flags):
+                if errors:
+                    raise RuntimeError("; ".join(errors))
+                return
+
+        # Stop the providers that lost the race
+        for idx, flag in enumerate(cancel_flags):
+            if idx != winner:
+                flag.set()
+
+        yield first_token
+        while True:
+            idx, kind, value = events.get()
+            if idx != winner:
+                continue
+            if kind == "token":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
@@ -0,0 +1,57 @@
+import streamlit as st
+from utils.qdrant_ops import QdrantRAG
+
+def migrate_qdrant_collections():
+    """Apply quantization / on-disk payload / HNSW settings to existing Qdrant collections"""
+    
+    st.title("🗜️ Migrate Qdrant Collections")
+    st.write("This applies the collection options from secrets.toml to every existing collection")
+    
+    options = QdrantRAG.get_collection_options()
+    if not options:
+        st.info("No collection options set. Add e.g. `quantization = \"int8\"`, `on_disk_payload = true`, `hnsw_m = 16` under [qdrant] in secrets.toml")
+        return
+    
+    st.write("Options to apply:")
+    st.json({key: str(value) for key, value in options.items()})
+    
+    try:
+        client = QdrantRAG.get_client()
+        if not client:
+            return
+        
+        collections = client.get_collections().collections
+        st.info(f"Found {len(collections)} collections")
+        
+        if st.button("🗜️ Migrate All Collections", type="primary"):
+            migrated_count = 0
+            error_count = 0
+            
+            progress_bar = st.progress(0)
+            
+            for idx, collection in enumerate(collections):
+                try:
+                    QdrantRAG.migrate_collection(collection.name)
+                    st.success(f"✅ Updated {collection.name}")
+                    migrated_count += 1
+                except Exception as e:
+                    st.error(f"❌ Error updating {collection.name}: {e}")
+                    error_count += 1
+                
+                progress_bar.progress((idx + 1) / len(collections))
+            
+            st.success(f"""
+                ✨ Done!
+                
+                - Migrated: {migrated_count} collections
+                - Errors: {error_count}
+                
+                Qdrant rebuilds segments in the background; memory drops once optimization finishes.
+            """)
+    
+    except Exception as e:
+        st.error(f"Error connecting to Qdrant: {e}")
+        st.exception(e)
+
+if __name__ == "__main__":
+    migrate_qdrant_collections()
@@ -0,0 +1,56 @@
+import streamlit as st
+from utils.qdrant_ops import QdrantRAG
+
+def migrate_to_shared_collection():
+    """Copy all per-subject Qdrant collections into the single shared collection"""
+    
+    st.title("🗂️ Migrate to Shared Collection")
+    st.write("This copies every `subject_*` collection into one collection partitioned by the `subject` field")
+    
+    if not QdrantRAG.use_shared_collection():
+        st.warning("Set `collection_mode = \"shared\"` under [qdrant] in secrets.toml first, so new uploads and searches use the shared collection")
+        return
+    
+    shared_name = QdrantRAG.get_setting("shared_collection", "documents")
+    st.info(f"Target collection: {shared_name}")
+    
+    try:
+        client = QdrantRAG.get_client()
+        if not client:
+            return
+        
+        sources = [
+            col.name for col in client.get_collections().collections
+            if col.name.startswith("subject_") and col.name != shared_name
+        ]
+        st.info(f"Found {len(sources)} subject collections")
+        
+        if st.button("🗂️ Migrate All Collections", type="primary"):
+            status = st.empty()
+            
+            def on_progress(collection_name, points_copied):
+                status.write(f"Copying {collection_name}: {points_copied} points")
+            
+            copied, skipped = QdrantRAG.migrate_to_shared_collection(on_progress=on_progress)
+            
+            for collection_name, count in copied.items():
+                st.success(f"✅ {collection_name}: {count} points")
+                if skipped.get(collection_name):
+                    st.warning(f"⚠️ {collection_name}: skipped {skipped[collection_name]} points with no subject (no matching subject found)")
+            
+            st.success(f"""
+                ✨ Done!
+                
+                - Collections copied: {len(copied)}
+                - Points copied: {sum(copied.values())}
+                - Points skipped: {sum(skipped.values())}
+                
+                The old subject collections were kept. Delete them once search results look right.
+            """)
+    
+    except Exception as e:
+        st.error(f"Error migrating collections: {e}")
+        st.exception(e)
+
+if __name__ == "__main__":
+    migrate_to_shared_collection()
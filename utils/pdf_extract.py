@@ -0,0 +1,115 @@
+import io
+import multiprocessing
+from bisect import bisect_right
+import PyPDF2
+
+# Kept free of Streamlit/model imports so pool workers start quickly
+
+_worker_reader = None
+
+def _init_worker(file_content):
+    """Open the PDF once per worker process"""
+    global _worker_reader
+    _worker_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+
+def _extract_page(page_index):
+    """Extract text from a single page inside a worker process"""
+    return _worker_reader.pages[page_index].extract_text() or ""
+
+def _start_pool(file_content, processes):
+    """Start a worker pool with the PDF opened in each worker"""
+    # spawn avoids forking the threaded Streamlit server process
+    return multiprocessing.get_context("spawn").Pool(
+        processes=processes,
+        initializer=_init_worker,
+        initargs=(file_content,)
+    )
+
+def _stop_pool(pool):
+    """terminate() also kills workers stuck on a malformed page"""
+    pool.terminate()
+    pool.join()
+
+def iter_pdf_pages(file_content, workers=0, page_timeout=30, max_timeouts=3):
+    """
+    Yield (page_number, text) for each page of a PDF, in order.
+    With workers > 1 pages are extracted in a process pool and any page
+    taking longer than page_timeout seconds is skipped (yielded as "").
+    A timed-out page leaves its worker stuck, so the pool is restarted for
+    the remaining pages; after max_timeouts hung pages the rest of the
+    document is skipped rather than waiting on it.
+    """
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    page_count = len(pdf_reader.pages)
+
+    if workers <= 1 or page_count < 2:
+        for page_index, page in enumerate(pdf_reader.pages):
+            yield page_index + 1, page.extract_text() or ""
+        return
+
+    processes = min(workers, page_count)
+    pool = _start_pool(file_content, processes)
+    try:
+        timeouts = 0
+        next_page = 0
+        while next_page < page_count:
+            pending = [(page_index, pool.apply_async(_extract_page, (page_index,))) for page_index in range(next_page, page_count)]
+            for page_index, result in pending:
+                next_page = page_index + 1
+                try:
+                    text = result.get(timeout=page_timeout)
+                except multiprocessing.TimeoutError:
+                    yield page_index + 1, ""
+                    timeouts += 1
+                    _stop_pool(pool)
+                    if timeouts >= max_timeouts:
+                        # Too many hung pages - give up on the rest of this file
+                        for skipped in range(next_page, page_count):
+                            yield skipped + 1, ""
+                        next_page = page_count
+                        pool = None
+                    else:
+                        # Fresh workers for the pages after the hung one
+                        pool = _start_pool(file_content, processes)
+                    break
+                except Exception:
+                    text = ""
+                yield page_index + 1, text
+    finally:
+        if pool is not None:
+            _stop_pool(pool)
+
+def iter_chunks(pages, chunk_size=1000, overlap=100):
+    """
+    Split streamed (page_number, text) pairs into overlapping chunks.
+    Yields (chunk_text, page_start, page_end) without building the full text.
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    buffer_start = 0  # global offset of buffer[0]
+    page_offsets = []  # global offset where each page starts
+    page_numbers = []
+
+    def page_at(offset):
+        return page_numbers[max(bisect_right(page_offsets, offset) - 1, 0)]
+
+    def emit():
+        chunk = buffer[:chunk_size]
+        return chunk, page_at(buffer_start), page_at(buffer_start + len(chunk) - 1)
+
+    for page_number, text in pages:
+        if not text:
+            continue
+        page_offsets.append(buffer_start + len(buffer))
+        page_numbers.append(page_number)
+        buffer += text
+
+        while len(buffer) >= chunk_size:
+            yield emit()
+            buffer = buffer[step:]
+            buffer_start += step
+
+    while buffer:
+        yield emit()
+        buffer = buffer[step:]
+        buffer_start += step
@@ -1,29 +1,169 @@
 import streamlit as st
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, PayloadSchemaType
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PayloadSchemaType,
+    Filter, FieldCondition, MatchValue, MatchAny, Range, HasIdCondition,
+    HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams, QuantizationSearchParams, CollectionParamsDiff, VectorParamsDiff
+)
 import hashlib
+import os
+import uuid
 from datetime import datetime
-import PyPDF2
-import io
+import time
+import threading
+import numpy as np
+from utils.cache import TTLCache
+from utils.pdf_extract import iter_pdf_pages, iter_chunks
+from utils.embeddings import load_backend
+from utils.bm25 import BM25Index
+from utils.dedup import select_diverse, dedupe_by_text
+from utils.llm import LLMClients
+from utils.context_packer import pack_context
 
 class QdrantRAG:
     """Handle all Qdrant vector database operations for RAG - FREE VERSION"""
     
     # Cache the embedding model (loaded once)
+    EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
     _embedding_model = None
     
+    # Cache of query vectors keyed by (model name + backend, normalised query)
+    _query_embedding_cache = None
+    
+    # Cache of LLM answers keyed by (subject, normalised query, language)
+    _response_cache = None
+    
+    # BM25 indexes per subject (loaded from disk or rebuilt from Qdrant)
+    _lexical_indexes = {}
+    _lexical_locks = {}   # subject -> lock held while that index loads or rebuilds
+    _lexical_lock = threading.Lock()
+    
+    # Default number of chunks encoded per model.encode call
+    DEFAULT_EMBEDDING_BATCH_SIZE = 64
+    
+    # Payload indexes every subject collection should have
+    INDEXED_FIELDS = {
+        "file_name": PayloadSchemaType.KEYWORD,
+        "subject": PayloadSchemaType.KEYWORD,
+        "doc_id": PayloadSchemaType.KEYWORD,
+        "verified": PayloadSchemaType.BOOL,
+        "chunk_index": PayloadSchemaType.INTEGER,
+    }
+    
+    # Registry of known collections: name -> set of indexed payload fields
+    _known_collections = {}
+    _collections_loaded_at = 0.0
+    _collections_lock = threading.Lock()
+    
     @staticmethod
-    def get_client():
-        """Get Qdrant client from secrets"""
+    def get_setting(key, default=None):
+        """Read an optional setting from the [qdrant] section of secrets"""
         try:
-            return QdrantClient(
-                url=st.secrets["qdrant"]["url"],
-                api_key=st.secrets["qdrant"]["api_key"]
-            )
-        except Exception as e:
-            st.warning(f"⚠️ Qdrant not configured. RAG features disabled. Add Qdrant credentials to secrets.toml")
-            return None
+            return st.secrets.get("qdrant", {}).get(key, default)
+        except Exception:
+            return default
+    
+    # Shared Qdrant client (one per process, reused across sessions)
+    _client = None
+    _client_config = None
+    _client_lock = threading.Lock()
+    
+    @staticmethod
+    def get_connection_config():
+        """
+        Read Qdrant connection settings from secrets once and cache them.
+        mode = "remote" (default) uses url/api_key; "local" stores data on disk
+        at `path`; "memory" keeps everything in RAM. QDRANT_MODE / QDRANT_PATH
+        environment variables override secrets (handy for CI and benchmarks).
+        """
+        if QdrantRAG._client_config is None:
+            mode = os.environ.get("QDRANT_MODE") or QdrantRAG.get_setting("mode", "remote")
+            
+            if mode in ("local", "memory"):
+                QdrantRAG._client_config = {
+                    "mode": mode,
+                    "path": os.environ.get("QDRANT_PATH") or QdrantRAG.get_setting("path", ".qdrant_local"),
+                }
+                return QdrantRAG._client_config
+            
+            try:
+                qdrant_secrets = st.secrets["qdrant"]
+                QdrantRAG._client_config = {
+                    "mode": "remote",
+                    "url": qdrant_secrets["url"],
+                    "api_key": qdrant_secrets["api_key"],
+                    "timeout": int(qdrant_secrets.get("timeout", 10)),
+                    "prefer_grpc": bool(qdrant_secrets.get("prefer_grpc", False)),
+                    "grpc_port": int(qdrant_secrets.get("grpc_port", 6334)),
+                    "max_connections": int(qdrant_secrets.get("max_connections", 20)),
+                    "keepalive_expiry": float(qdrant_secrets.get("keepalive_expiry", 60)),
+                }
+            except Exception:
+                return None
+        return QdrantRAG._client_config
+    
+    @staticmethod
+    def get_client():
+        """Get the shared Qdrant client (created once, thread-safe)"""
+        if QdrantRAG._client is not None:
+            return QdrantRAG._client
+        
+        with QdrantRAG._client_lock:
+            # Another thread may have built it while we waited
+            if QdrantRAG._client is not None:
+                return QdrantRAG._client
+            
+            config = QdrantRAG.get_connection_config()
+            if not config:
+                st.warning(f"⚠️ Qdrant not configured. RAG features disabled. Add Qdrant credentials to secrets.toml")
+                return None
+            
+            try:
+                if config["mode"] == "memory":
+                    # Embedded in-process Qdrant, nothing persisted
+                    QdrantRAG._client = QdrantClient(location=":memory:")
+                elif config["mode"] == "local":
+                    # Embedded Qdrant persisted to a local folder
+                    QdrantRAG._client = QdrantClient(path=config["path"])
+                else:
+                    import httpx
+                    
+                    # Keep connections alive so requests skip TCP/TLS setup
+                    QdrantRAG._client = QdrantClient(
+                        url=config["url"],
+                        api_key=config["api_key"],
+                        timeout=config["timeout"],
+                        prefer_grpc=config["prefer_grpc"],
+                        grpc_port=config["grpc_port"],
+                        limits=httpx.Limits(
+                            max_connections=config["max_connections"],
+                            max_keepalive_connections=config["max_connections"],
+                            keepalive_expiry=config["keepalive_expiry"]
+                        )
+                    )
+            except Exception as e:
+                st.warning(f"⚠️ Could not connect to Qdrant: {e}")
+                return None
+        
+        return QdrantRAG._client
+    
+    @staticmethod
+    def reset_client():
+        """Drop the shared client and cached config (e.g. after secrets change)"""
+        with QdrantRAG._client_lock:
+            if QdrantRAG._client is not None:
+                try:
+                    QdrantRAG._client.close()
+                except Exception:
+                    pass
+            QdrantRAG._client = None
+            QdrantRAG._client_config = None
+        
+        # Collections seen through the old client may not exist on the new one
+        with QdrantRAG._collections_lock:
+            QdrantRAG._known_collections = {}
+            QdrantRAG._collections_loaded_at = 0.0
     
     @staticmethod
     @st.cache_resource
@@ -32,55 +172,214 @@ class QdrantRAG:
         if QdrantRAG._embedding_model is None:
             try:
                 # Use free, lightweight model: all-MiniLM-L6-v2 (384 dimensions)
-                QdrantRAG._embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+                # embedding_backend = "onnx" switches to the int8 ONNX Runtime export
+                backend = QdrantRAG.get_setting("embedding_backend", "torch")
+                options = {}
+                if backend == "onnx":
+                    options["model_file"] = QdrantRAG.get_setting("onnx_model_file", "onnx/model_quint8_avx2.onnx")
+                    options["threads"] = int(QdrantRAG.get_setting("onnx_threads", 0))
+                QdrantRAG._embedding_model = load_backend(backend, QdrantRAG.EMBEDDING_MODEL_NAME, **options)
             except Exception as e:
                 st.error(f"Failed to load embedding model: {e}")
                 return None
         return QdrantRAG._embedding_model
     
     @staticmethod
-    def create_collection_if_not_exists(collection_name):
-        """Create Qdrant collection if it doesn't exist WITH proper payload indexes"""
+    def subject_collection_name(subject):
+        """Per-subject collection name, e.g. 'Further Maths (A-Level)' -> 'subject_further_maths_a-level'"""
+        return f"subject_{subject.lower().replace(' ', '_').replace('+', '').replace('(', '').replace(')', '').replace(',', '')}"
+    
+    @staticmethod
+    def use_shared_collection():
+        """True when qdrant.collection_mode = "shared" (one collection, partitioned by subject)"""
+        return QdrantRAG.get_setting("collection_mode", "per_subject") == "shared"
+    
+    @staticmethod
+    def get_collection_name(subject):
+        """Collection holding a subject's chunks: the shared collection, or subject_<name>"""
+        if QdrantRAG.use_shared_collection():
+            return QdrantRAG.get_setting("shared_collection", "documents")
+        return QdrantRAG.subject_collection_name(subject)
+    
+    @staticmethod
+    def refresh_collection_registry(force=False):
+        """Load the list of collections into memory (at most once per TTL)"""
+        ttl = float(QdrantRAG.get_setting("collection_cache_ttl", 300))
+        if not force and QdrantRAG._collections_loaded_at and time.time() - QdrantRAG._collections_loaded_at < ttl:
+            return True
+        
         client = QdrantRAG.get_client()
         if not client:
             return False
         
-        try:
-            collections = client.get_collections().collections
-            exists = any(col.name == collection_name for col in collections)
+        with QdrantRAG._collections_lock:
+            # Another thread may have refreshed while we waited
+            if not force and QdrantRAG._collections_loaded_at and time.time() - QdrantRAG._collections_loaded_at < ttl:
+                return True
             
-            if not exists:
-                # Create collection with vector config
-                client.create_collection(
+            names = [col.name for col in client.get_collections().collections]
+            # Keep index info we already know about, drop deleted collections
+            QdrantRAG._known_collections = {
+                name: QdrantRAG._known_collections.get(name)
+                for name in names
+            }
+            QdrantRAG._collections_loaded_at = time.time()
+        return True
+    
+    @staticmethod
+    def collection_exists(collection_name):
+        """Check the in-memory registry for a collection"""
+        if not QdrantRAG.refresh_collection_registry():
+            return False
+        return collection_name in QdrantRAG._known_collections
+    
+    @staticmethod
+    def get_indexed_fields(collection_name):
+        """Return the set of payload fields indexed in a collection (cached)"""
+        indexed = QdrantRAG._known_collections.get(collection_name)
+        if indexed is not None:
+            return indexed
+        
+        client = QdrantRAG.get_client()
+        if not client:
+            return set()
+        
+        info = client.get_collection(collection_name)
+        indexed = set((info.payload_schema or {}).keys())
+        with QdrantRAG._collections_lock:
+            QdrantRAG._known_collections[collection_name] = indexed
+        return indexed
+    
+    @staticmethod
+    def ensure_payload_indexes(collection_name, fields=None):
+        """Create any missing payload indexes on a collection"""
+        client = QdrantRAG.get_client()
+        if not client:
+            return
+        
+        fields = fields or QdrantRAG.INDEXED_FIELDS
+        indexed = QdrantRAG.get_indexed_fields(collection_name)
+        
+        for field_name in fields:
+            if field_name in indexed:
+                continue
+            try:
+                client.create_payload_index(
                     collection_name=collection_name,
-                    vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+                    field_name=field_name,
+                    field_schema=QdrantRAG.INDEXED_FIELDS.get(field_name, PayloadSchemaType.KEYWORD)
                 )
-                
-                # IMPORTANT: Create payload indexes for filtering
-                # This allows us to filter by file_name, subject, etc.
-                try:
-                    client.create_payload_index(
-                        collection_name=collection_name,
-                        field_name="file_name",
-                        field_schema=PayloadSchemaType.KEYWORD
-                    )
-                    client.create_payload_index(
-                        collection_name=collection_name,
-                        field_name="subject",
-                        field_schema=PayloadSchemaType.KEYWORD
-                    )
-                    client.create_payload_index(
-                        collection_name=collection_name,
-                        field_name="doc_id",
-                        field_schema=PayloadSchemaType.KEYWORD
-                    )
-                except Exception as index_error:
-                    # Indexes might already exist or not be needed
-                    st.warning(f"Could not create indexes (may already exist): {index_error}")
-                
-                return True
+            except Exception as index_error:
+                # Indexes might already exist or not be needed
+                if "already exists" not in str(index_error).lower():
+                    st.warning(f"Could not create index {field_name}: {index_error}")
+                    continue
+            indexed.add(field_name)
+    
+    @staticmethod
+    def get_collection_options():
+        """
+        Storage settings for subject collections, from the [qdrant] secrets:
+        quantization = "int8" (scalar quantization, originals kept for rescoring),
+        vectors_on_disk (on by default with int8, so only the quantized copy
+        stays in RAM), on_disk_payload = true (chunk text stays on disk),
+        hnsw_m / hnsw_ef_construct, and hnsw_payload_m for the shared collection.
+        """
+        options = {}
+        
+        hnsw_m = QdrantRAG.get_setting("hnsw_m")
+        hnsw_ef_construct = QdrantRAG.get_setting("hnsw_ef_construct")
+        # Shared collection: also link points within each subject so filtered searches stay fast
+        payload_m = QdrantRAG.get_setting("hnsw_payload_m", 16) if QdrantRAG.use_shared_collection() else None
+        if hnsw_m or hnsw_ef_construct or payload_m:
+            options["hnsw_config"] = HnswConfigDiff(
+                m=int(hnsw_m) if hnsw_m else None,
+                ef_construct=int(hnsw_ef_construct) if hnsw_ef_construct else None,
+                payload_m=int(payload_m) if payload_m else None
+            )
+        
+        quantized = QdrantRAG.get_setting("quantization", "none") == "int8"
+        if bool(QdrantRAG.get_setting("vectors_on_disk", quantized)):
+            options["vectors_on_disk"] = True
+        
+        if quantized:
+            options["quantization_config"] = ScalarQuantization(
+                scalar=ScalarQuantizationConfig(
+                    type=ScalarType.INT8,
+                    quantile=float(QdrantRAG.get_setting("quantization_quantile", 0.99)),
+                    always_ram=True
+                )
+            )
+        
+        if QdrantRAG.get_setting("on_disk_payload", False):
+            options["on_disk_payload"] = True
+        
+        return options
+    
+    @staticmethod
+    def get_search_params():
+        """Search parameters matching the collection options (rescoring for quantized vectors)"""
+        if QdrantRAG.get_setting("quantization", "none") != "int8":
+            return None
+        return SearchParams(
+            quantization=QuantizationSearchParams(
+                rescore=True,
+                oversampling=float(QdrantRAG.get_setting("quantization_oversampling", 2.0))
+            )
+        )
+    
+    @staticmethod
+    def migrate_collection(collection_name):
+        """Apply the current collection options (quantization, on-disk payload, HNSW) to an existing collection"""
+        client = QdrantRAG.get_client()
+        if not client:
+            return False
+        
+        options = QdrantRAG.get_collection_options()
+        client.update_collection(
+            collection_name=collection_name,
+            vectors_config={"": VectorParamsDiff(on_disk=True)} if options.get("vectors_on_disk") else None,
+            hnsw_config=options.get("hnsw_config"),
+            quantization_config=options.get("quantization_config"),
+            collection_params=CollectionParamsDiff(on_disk_payload=True) if options.get("on_disk_payload") else None
+        )
+        return True
+    
+    @staticmethod
+    def create_collection_if_not_exists(collection_name):
+        """Create Qdrant collection if it doesn't exist WITH proper payload indexes"""
+        client = QdrantRAG.get_client()
+        if not client:
             return False
+        
+        try:
+            if QdrantRAG.collection_exists(collection_name):
+                return False
+            
+            # Create collection with vector config
+            options = QdrantRAG.get_collection_options()
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(
+                    size=384,
+                    distance=Distance.COSINE,
+                    on_disk=options.pop("vectors_on_disk", None)
+                ),
+                **options
+            )
+            with QdrantRAG._collections_lock:
+                QdrantRAG._known_collections[collection_name] = set()
+            
+            # IMPORTANT: Create payload indexes for filtering
+            # This allows us to filter by file_name, subject, etc.
+            QdrantRAG.ensure_payload_indexes(collection_name)
+            
+            return True
         except Exception as e:
+            if "already exists" in str(e).lower():
+                # Created by another process since our last refresh
+                QdrantRAG.refresh_collection_registry(force=True)
+                return False
             st.error(f"Error creating collection: {e}")
             return False
     
@@ -100,241 +399,707 @@ class QdrantRAG:
             st.error(f"Error getting embeddings: {e}")
             return None
     
+    @staticmethod
+    def normalize_query(query):
+        """Normalise query text so trivially different questions share a cache key"""
+        return " ".join(query.lower().split())
+    
+    @staticmethod
+    def get_query_embedding_cache():
+        """Get the process-wide query embedding cache"""
+        if QdrantRAG._query_embedding_cache is None:
+            QdrantRAG._query_embedding_cache = TTLCache(
+                maxsize=int(QdrantRAG.get_setting("query_cache_size", 2048)),
+                ttl=float(QdrantRAG.get_setting("query_cache_ttl", 86400))
+            )
+        return QdrantRAG._query_embedding_cache
+    
+    @staticmethod
+    def get_query_embedding(query):
+        """Get a query embedding, reusing cached vectors for repeated questions"""
+        cache = QdrantRAG.get_query_embedding_cache()
+        model_key = f"{QdrantRAG.EMBEDDING_MODEL_NAME}:{QdrantRAG.get_setting('embedding_backend', 'torch')}"
+        normalized = QdrantRAG.normalize_query(query)
+        key = (model_key, normalized)
+        
+        embedding = cache.get(key)
+        if embedding is None:
+            embedding = QdrantRAG.get_embeddings(normalized)
+            if embedding:
+                cache.set(key, embedding)
+        return embedding
+    
+    @staticmethod
+    def get_query_cache_stats():
+        """Return hit/miss counters for the query embedding cache"""
+        return QdrantRAG.get_query_embedding_cache().stats()
+    
+    @staticmethod
+    def get_response_cache():
+        """Get the process-wide RAG answer cache"""
+        if QdrantRAG._response_cache is None:
+            QdrantRAG._response_cache = TTLCache(
+                maxsize=int(QdrantRAG.get_setting("response_cache_size", 1024)),
+                ttl=float(QdrantRAG.get_setting("response_cache_ttl", 3600))
+            )
+        return QdrantRAG._response_cache
+    
+    @staticmethod
+    def invalidate_subject_cache(subject=None):
+        """Drop cached answers for a subject (or all subjects) after its files change"""
+        cache = QdrantRAG.get_response_cache()
+        if subject is None:
+            cache.invalidate(lambda key: True)
+        else:
+            cache.invalidate(lambda key: key[0] == subject)
+    
+    @staticmethod
+    def get_embeddings_batch(texts, batch_size=None, raise_errors=False):
+        """Encode many texts at once, returning a NumPy matrix (one row per text)"""
+        try:
+            model = QdrantRAG.get_embedding_model()
+            if not texts:
+                return None
+            if not model:
+                if raise_errors:
+                    raise RuntimeError("Embedding model could not be loaded")
+                return None
+            
+            if batch_size is None:
+                batch_size = int(QdrantRAG.get_setting("embedding_batch_size", QdrantRAG.DEFAULT_EMBEDDING_BATCH_SIZE))
+            
+            # Single encode call - the model batches internally
+            return model.encode(
+                texts,
+                batch_size=max(1, batch_size),
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Error getting embeddings: {e}")
+            return None
+    
+    @staticmethod
+    def iter_file_pages(file_content, file_name):
+        """Yield (page_number, text) for a file; PDFs are streamed page by page"""
+        if file_name.lower().endswith('.pdf'):
+            # Optionally fan large PDFs out to a process pool
+            yield from iter_pdf_pages(
+                file_content,
+                workers=int(QdrantRAG.get_setting("pdf_workers", 0)),
+                page_timeout=float(QdrantRAG.get_setting("pdf_page_timeout", 30)),
+                max_timeouts=int(QdrantRAG.get_setting("pdf_max_timeouts", 3))
+            )
+        else:
+            # Try to decode as text
+            yield 1, file_content.decode('utf-8', errors='ignore')
+    
     @staticmethod
     def extract_text_from_file(file_content, file_name):
         """Extract text from various file formats"""
         try:
-            if file_name.lower().endswith('.pdf'):
-                # Extract text from PDF
-                pdf_file = io.BytesIO(file_content)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                return text
-            elif file_name.lower().endswith('.txt'):
-                return file_content.decode('utf-8', errors='ignore')
-            else:
-                # Try to decode as text
-                return file_content.decode('utf-8', errors='ignore')
+            return "".join(text for _, text in QdrantRAG.iter_file_pages(file_content, file_name))
         except Exception as e:
             st.error(f"Error extracting text: {e}")
             return str(file_content)
     
     @staticmethod
-    def upload_document_to_qdrant(file_name, file_content, subject, user_id, doc_id):
+    def make_point_id(doc_id, chunk):
+        """Deterministic point ID from doc_id + chunk content, so re-ingestion overwrites in place"""
+        content_hash = hashlib.md5(chunk.encode('utf-8', errors='ignore')).hexdigest()
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{doc_id}:{content_hash}"))
+    
+    @staticmethod
+    def upload_document_to_qdrant(file_name, file_content, subject, user_id, doc_id, reingest=False, verified=False, on_stage=None, on_stats=None, raise_errors=False):
         """
-        Process document and upload to Qdrant using FREE embeddings
+        Process document and upload to Qdrant using FREE embeddings.
+        With reingest=True, chunks of this doc_id that are no longer produced
+        (e.g. the document got shorter) are deleted after the upsert.
+        on_stage, if given, is called with 'extracting' and 'embedding';
+        on_stats with this upload's {'chunks', 'seconds', 'chunks_per_sec'}.
+        raise_errors=True raises failures instead of reporting them with
+        st.error (for background workers, where st.error shows nothing).
         """
         try:
             client = QdrantRAG.get_client()
             if not client:
+                if raise_errors:
+                    raise RuntimeError("Qdrant not configured")
                 st.warning("⚠️ Qdrant not configured - file saved to Firebase only")
                 return 0
             
-            collection_name = f"subject_{subject.lower().replace(' ', '_').replace('+', '').replace('(', '').replace(')', '').replace(',', '')}"
+            collection_name = QdrantRAG.get_collection_name(subject)
             
             # Create collection with proper indexes
             QdrantRAG.create_collection_if_not_exists(collection_name)
             
-            # Extract text
-            text_content = QdrantRAG.extract_text_from_file(file_content, file_name)
+            if on_stage:
+                on_stage('extracting')
             
-            if not text_content or len(text_content.strip()) < 10:
+            # Stream text page by page and chunk it (1000 chars with 100 overlap)
+            chunks = []
+            chunk_pages = []
+            try:
+                pages = QdrantRAG.iter_file_pages(file_content, file_name)
+                for chunk, page_start, page_end in iter_chunks(pages, chunk_size=1000, overlap=100):
+                    if len(chunk.strip()) > 50:  # Minimum chunk size
+                        chunks.append(chunk)
+                        chunk_pages.append((page_start, page_end))
+            except Exception as e:
+                if raise_errors:
+                    raise
+                st.error(f"Error extracting text: {e}")
+            
+            if not chunks:
                 return 0
             
-            # Chunk text (1000 chars with 100 overlap)
-            chunk_size = 1000
-            overlap = 100
-            chunks = []
+            if on_stage:
+                on_stage('embedding')
+            
+            # Embed all chunks in batches
+            start_time = time.perf_counter()
+            embeddings = QdrantRAG.get_embeddings_batch(chunks, raise_errors=raise_errors)
             
-            for i in range(0, len(text_content), chunk_size - overlap):
-                chunk = text_content[i:i + chunk_size]
-                if len(chunk.strip()) > 50:  # Minimum chunk size
-                    chunks.append(chunk)
+            if embeddings is None:
+                return 0
+            
+            # Convert the whole matrix in one go instead of per chunk
+            vectors = embeddings.tolist()
+            upload_time = datetime.now().isoformat()
             
-            # Upload chunks
-            points = []
-            for idx, chunk in enumerate(chunks):
-                embedding = QdrantRAG.get_embeddings(chunk)
+            points = {}
+            for idx, (chunk, vector, (page_start, page_end)) in enumerate(zip(chunks, vectors, chunk_pages)):
+                # Same doc + same text -> same ID (repeated chunks collapse into one point)
+                point_id = QdrantRAG.make_point_id(doc_id, chunk)
                 
-                if embedding:
-                    # Use a more unique point ID to avoid collisions
-                    point_id = hashlib.md5(f"{doc_id}_{file_name}_{idx}_{datetime.now().timestamp()}".encode()).hexdigest()
-                    
-                    points.append(
-                        PointStruct(
-                            id=point_id,
-                            vector=embedding,
-                            payload={
-                                "text": chunk,
-                                "file_name": file_name,
-                                "subject": subject,
-                                "user_id": user_id,
-                                "doc_id": doc_id,
-                                "chunk_index": idx,
-                                "upload_time": datetime.now().isoformat()
-                            }
-                        )
+                points[point_id] = (
+                    PointStruct(
+                        id=point_id,
+                        vector=vector,
+                        payload={
+                            "text": chunk,
+                            "file_name": file_name,
+                            "subject": subject,
+                            "user_id": user_id,
+                            "doc_id": doc_id,
+                            "chunk_index": idx,
+                            "page_start": page_start,
+                            "page_end": page_end,
+                            "verified": verified,
+                            "upload_time": upload_time
+                        }
                     )
+                )
             
             # Batch upload
             if points:
                 client.upsert(
                     collection_name=collection_name,
-                    points=points
+                    points=list(points.values())
                 )
+                
+                if reingest:
+                    # Remove stale chunks left over from a longer previous version
+                    client.delete(
+                        collection_name=collection_name,
+                        points_selector=Filter(
+                            must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))],
+                            must_not=[HasIdCondition(has_id=list(points.keys()))]
+                        )
+                    )
+                QdrantRAG.invalidate_subject_cache(subject)
+                
+                # Keep the keyword index in step with the vectors
+                try:
+                    lexical_index = QdrantRAG.get_lexical_index(subject)
+                    lexical_index.add_document(doc_id, [
+                        (point_id, point.payload["text"], file_name)
+                        for point_id, point in points.items()
+                    ])
+                    QdrantRAG.save_lexical_index(subject, lexical_index)
+                except Exception as e:
+                    # Vectors are stored; the keyword index rebuilds from them if needed
+                    if not raise_errors:
+                        st.warning(f"Could not update keyword index: {e}")
+                
+                elapsed = time.perf_counter() - start_time
+                if on_stats:
+                    on_stats({
+                        "chunks": len(points),
+                        "seconds": elapsed,
+                        "chunks_per_sec": len(points) / elapsed if elapsed > 0 else 0.0
+                    })
                 return len(points)
             
             return 0
             
         except Exception as e:
+            if raise_errors:
+                raise
             st.error(f"Error uploading to Qdrant: {e}")
             return 0
     
     @staticmethod
-    def search_documents(query, subject, limit=5):
-        """Search Qdrant for relevant document chunks using FREE embeddings"""
+    def build_filter(subject=None, verified_only=False, file_names=None, doc_ids=None):
+        """Build a Qdrant payload filter from the indexed fields"""
+        conditions = []
+        
+        if subject:
+            conditions.append(FieldCondition(key="subject", match=MatchValue(value=subject)))
+        if verified_only:
+            conditions.append(FieldCondition(key="verified", match=MatchValue(value=True)))
+        if file_names:
+            conditions.append(FieldCondition(key="file_name", match=MatchAny(any=list(file_names))))
+        if doc_ids:
+            conditions.append(FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids))))
+        
+        return Filter(must=conditions) if conditions else None
+    
+    @staticmethod
+    def get_lexical_index_dir():
+        """
+        Folder for persisted BM25 indexes, tied to where the vectors live:
+        next to the data in local mode, qdrant.bm25_dir for a remote server,
+        and None in memory mode (vectors vanish on restart, so must the index).
+        """
+        config = QdrantRAG.get_connection_config() or {}
+        if config.get("mode") == "memory":
+            return None
+        if config.get("mode") == "local":
+            return os.path.join(config["path"], "bm25")
+        return QdrantRAG.get_setting("bm25_dir", ".bm25_index")
+    
+    @staticmethod
+    def get_lexical_index_path(subject):
+        """File where a subject's BM25 index is persisted, or None if it is kept in memory only"""
+        directory = QdrantRAG.get_lexical_index_dir()
+        if directory is None:
+            return None
+        return os.path.join(directory, f"{QdrantRAG.subject_collection_name(subject)}.json")
+    
+    @staticmethod
+    def save_lexical_index(subject, index):
+        """Persist a subject's BM25 index (no-op in memory mode)"""
+        path = QdrantRAG.get_lexical_index_path(subject)
+        if path:
+            index.save(path)
+    
+    @staticmethod
+    def get_lexical_index(subject):
+        """Get a subject's BM25 index, loading it from disk or rebuilding it from Qdrant"""
+        index = QdrantRAG._lexical_indexes.get(subject)
+        if index is not None:
+            return index
+        
+        # Per-subject lock: a cold rebuild of one subject doesn't block searches on others
+        with QdrantRAG._lexical_lock:
+            subject_lock = QdrantRAG._lexical_locks.setdefault(subject, threading.Lock())
+        
+        with subject_lock:
+            index = QdrantRAG._lexical_indexes.get(subject)
+            if index is not None:
+                return index
+            
+            path = QdrantRAG.get_lexical_index_path(subject)
+            index = None
+            if path and os.path.exists(path):
+                try:
+                    index = BM25Index.load(path)
+                except Exception as e:
+                    # Corrupt or partial file - the chunk text in Qdrant is the source of truth
+                    print(f"Could not load keyword index {path}, rebuilding: {e}")
+            if index is None:
+                index = QdrantRAG.rebuild_lexical_index(subject)
+            
+            QdrantRAG._lexical_indexes[subject] = index
+            return index
+    
+    @staticmethod
+    def delete_all_documents():
+        """
+        Drop every subject collection (or the shared collection) and all keyword
+        indexes, in memory and on disk - used when all uploads are deleted.
+        """
+        client = QdrantRAG.get_client()
+        if client and QdrantRAG.refresh_collection_registry(force=True):
+            shared_name = QdrantRAG.get_setting("shared_collection", "documents")
+            for collection_name in list(QdrantRAG._known_collections):
+                if collection_name.startswith("subject_") or collection_name == shared_name:
+                    client.delete_collection(collection_name=collection_name)
+            QdrantRAG.refresh_collection_registry(force=True)
+        
+        with QdrantRAG._lexical_lock:
+            QdrantRAG._lexical_indexes = {}
+            directory = QdrantRAG.get_lexical_index_dir()
+            if directory and os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    if name.endswith(".json"):
+                        os.remove(os.path.join(directory, name))
+        
+        QdrantRAG.invalidate_subject_cache()
+    
+    @staticmethod
+    def delete_document(subject, doc_id):
+        """
+        Remove a rejected/deleted document's chunks from Qdrant and from its
+        subject's keyword index (both, so a later index rebuild can't bring it back).
+        """
+        if not subject or not doc_id:
+            return
+        try:
+            client = QdrantRAG.get_client()
+            collection_name = QdrantRAG.get_collection_name(subject)
+            if client and QdrantRAG.collection_exists(collection_name):
+                client.delete(
+                    collection_name=collection_name,
+                    points_selector=QdrantRAG.build_filter(subject=subject, doc_ids=[doc_id])
+                )
+            
+            index = QdrantRAG.get_lexical_index(subject)
+            index.remove_document(doc_id)
+            QdrantRAG.save_lexical_index(subject, index)
+        except Exception as e:
+            st.warning(f"Could not remove document from Qdrant: {e}")
+    
+    @staticmethod
+    def rebuild_lexical_index(subject):
+        """Build a subject's BM25 index from the chunk text already stored in Qdrant"""
+        index = BM25Index()
+        client = QdrantRAG.get_client()
+        collection_name = QdrantRAG.get_collection_name(subject)
+        if not client or not QdrantRAG.collection_exists(collection_name):
+            return index
+        
+        by_doc = {}
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=QdrantRAG.build_filter(subject=subject),
+                limit=256,
+                offset=offset,
+                with_payload=["text", "doc_id", "file_name"],
+                with_vectors=False
+            )
+            for point in points:
+                by_doc.setdefault(point.payload.get("doc_id", ""), []).append(
+                    (str(point.id), point.payload.get("text", ""), point.payload.get("file_name", "Unknown"))
+                )
+            if offset is None:
+                break
+        
+        for doc_id, chunks in by_doc.items():
+            index.add_document(doc_id, chunks)
+        QdrantRAG.save_lexical_index(subject, index)
+        return index
+    
+    @staticmethod
+    def fuse_results(vector_hits, lexical_hits, limit, k=60):
+        """Merge vector and BM25 rankings with reciprocal-rank fusion"""
+        fused = {}
+        for hits in (vector_hits, lexical_hits):
+            for rank, hit in enumerate(hits):
+                entry = fused.setdefault(hit["id"], {"doc": hit, "rrf": 0.0})
+                entry["rrf"] += 1.0 / (k + rank + 1)
+        
+        ranked = sorted(fused.values(), key=lambda entry: entry["rrf"], reverse=True)
+        return [entry["doc"] for entry in ranked[:limit]]
+    
+    @staticmethod
+    def diversify(client, collection_name, documents, query_embedding, limit):
+        """Drop near-duplicate hits (cosine >= qdrant.dedup_threshold), optionally re-ranking with MMR"""
+        # Fused keyword-only hits need their vectors fetched
+        missing = [doc["id"] for doc in documents if doc.get("vector") is None]
+        if missing:
+            for point in client.retrieve(collection_name=collection_name, ids=missing, with_vectors=True, with_payload=False):
+                for doc in documents:
+                    if doc["id"] == str(point.id):
+                        doc["vector"] = point.vector
+        
+        documents = [doc for doc in documents if doc.get("vector") is not None]
+        if not documents:
+            return []
+        
+        vectors = np.array([doc["vector"] for doc in documents], dtype=np.float32)
+        mmr_lambda = QdrantRAG.get_setting("mmr_lambda", None)
+        if mmr_lambda is None:
+            # Keep the existing ranking order
+            relevance = np.arange(len(documents), 0, -1, dtype=np.float32)
+        else:
+            mmr_lambda = float(mmr_lambda)
+            relevance = vectors @ np.asarray(query_embedding, dtype=np.float32)
+            relevance /= np.clip(np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_embedding), 1e-12, None)
+        
+        keep = select_diverse(
+            vectors,
+            relevance,
+            limit,
+            threshold=float(QdrantRAG.get_setting("dedup_threshold", 0.95)),
+            mmr_lambda=mmr_lambda
+        )
+        return [documents[idx] for idx in keep]
+    
+    @staticmethod
+    def get_search_collections(subject):
+        """Collections a search has to query; subject=None means every subject"""
+        if subject is not None or QdrantRAG.use_shared_collection():
+            return [QdrantRAG.get_collection_name(subject)]
+        
+        if not QdrantRAG.refresh_collection_registry():
+            return []
+        return [name for name in QdrantRAG._known_collections if name.startswith("subject_")]
+    
+    @staticmethod
+    def search_documents(query, subject=None, limit=5, verified_only=False, file_names=None, doc_ids=None, hybrid=None):
+        """
+        Search Qdrant for relevant document chunks using FREE embeddings.
+        With hybrid search (qdrant.hybrid_search, on by default) BM25 keyword
+        hits are fused with the vector hits; when the keyword match is
+        confident the vector search is skipped. verified_only searches are
+        vector-only because the keyword index does not track approval.
+        subject=None searches across all subjects (vector-only): one query on
+        the shared collection, or one per subject collection merged by score.
+        """
         try:
             client = QdrantRAG.get_client()
             if not client:
                 return []
             
-            collection_name = f"subject_{subject.lower().replace(' ', '_').replace('+', '').replace('(', '').replace(')', '').replace(',', '')}"
+            collection_names = QdrantRAG.get_search_collections(subject)
+            if not collection_names:
+                return []
             
-            # Get query embedding
-            query_embedding = QdrantRAG.get_embeddings(query)
+            if hybrid is None:
+                hybrid = bool(QdrantRAG.get_setting("hybrid_search", True))
+            
+            lexical_hits = []
+            if hybrid and not verified_only and subject is not None:
+                lexical_hits = QdrantRAG.get_lexical_index(subject).search(
+                    query, limit=limit * 2, file_names=file_names, doc_ids=doc_ids
+                )
+                
+                # Every query term found and a strong score: answer from keywords alone
+                min_score = float(QdrantRAG.get_setting("bm25_confident_score", 8.0))
+                if lexical_hits and lexical_hits[0]["coverage"] == 1.0 and lexical_hits[0]["score"] >= min_score:
+                    top_score = lexical_hits[0]["score"]
+                    return dedupe_by_text([
+                        {**hit, "score": hit["score"] / top_score}
+                        for hit in lexical_hits
+                    ], limit)
+            
+            # Get query embedding (cached for repeated questions)
+            query_embedding = QdrantRAG.get_query_embedding(query)
             
             if not query_embedding:
                 return []
             
-            # Search Qdrant WITHOUT filters (more reliable)
-            # We'll filter in the payload results instead
-            results = client.search(
-                collection_name=collection_name,
-                query_vector=query_embedding,
-                limit=limit * 2  # Get more results to filter
+            # Over-fetch so near-duplicates can be dropped and still fill `limit`
+            dedup = bool(QdrantRAG.get_setting("dedup_results", True))
+            candidate_limit = limit * int(QdrantRAG.get_setting("dedup_candidate_factor", 3)) if dedup else limit
+            
+            # Filter on the server using the payload indexes
+            query_filter = QdrantRAG.build_filter(
+                subject=subject,
+                verified_only=verified_only,
+                file_names=file_names,
+                doc_ids=doc_ids
             )
             
             # Extract relevant info
             documents = []
-            for result in results:
-                # Make sure the result is actually from this subject
-                if result.payload.get("subject", "").lower() == subject.lower():
+            for collection_name in collection_names:
+                results = client.search(
+                    collection_name=collection_name,
+                    query_vector=query_embedding,
+                    query_filter=query_filter,
+                    limit=candidate_limit,
+                    with_vectors=dedup,
+                    search_params=QdrantRAG.get_search_params()
+                )
+                
+                for result in results:
                     documents.append({
+                        "id": str(result.id),
                         "text": result.payload.get("text", ""),
                         "file_name": result.payload.get("file_name", "Unknown"),
-                        "score": result.score
+                        "subject": result.payload.get("subject", subject),
+                        "score": result.score,
+                        "vector": result.vector
                     })
-                    
-                    if len(documents) >= limit:
-                        break
             
-            return documents
+            if len(collection_names) > 1:
+                # Cosine scores are comparable across collections built with the same model
+                documents.sort(key=lambda doc: doc["score"], reverse=True)
+                documents = documents[:candidate_limit]
+            
+            if lexical_hits:
+                # Lexical-only hits have no cosine score; show them relative to the best keyword hit
+                top_score = lexical_hits[0]["score"]
+                lexical_hits = [{**hit, "score": hit["score"] / top_score, "vector": None} for hit in lexical_hits]
+                documents = QdrantRAG.fuse_results(documents, lexical_hits, candidate_limit)
+            
+            if dedup:
+                # Only keyword hits need vectors fetched, and those come from a single subject
+                documents = QdrantRAG.diversify(client, collection_names[0], documents, query_embedding, limit)
+            
+            return [
+                {key: value for key, value in doc.items() if key != "vector"}
+                for doc in documents[:limit]
+            ]
             
         except Exception as e:
             st.error(f"Error searching Qdrant: {e}")
             return []
     
     @staticmethod
-    def generate_rag_response(query, subject, language="English"):
+    def migrate_to_shared_collection(on_progress=None, batch_size=256):
         """
-        Generate intelligent RAG response using LLM (OpenAI/Anthropic)
+        Copy every subject_<name> collection into the shared collection,
+        keeping point IDs, vectors and payloads (safe to re-run). The source
+        collections are left in place. Points without a subject get the subject
+        whose collection name matches; if none does they are skipped, since
+        search could never reach them. on_progress, if given, is called with
+        (collection_name, points_copied). Returns ({collection_name: points_copied},
+        {collection_name: points_skipped}).
+        """
+        client = QdrantRAG.get_client()
+        if not client:
+            return {}
+        
+        shared_name = QdrantRAG.get_setting("shared_collection", "documents")
+        QdrantRAG.create_collection_if_not_exists(shared_name)
+        QdrantRAG.ensure_payload_indexes(shared_name)
+        QdrantRAG.refresh_collection_registry(force=True)
+        
+        # Collection name -> real subject name, for legacy points missing the subject field
+        from utils.firebase_ops import FirebaseOps
+        subject_names = {}
+        for _, subject_data in FirebaseOps.get_subjects():
+            subject_name = f"{subject_data.get('name', '')} ({subject_data.get('category', '')})"
+            subject_names[QdrantRAG.subject_collection_name(subject_name)] = subject_name
+        
+        copied = {}
+        skipped = {}
+        for collection_name in list(QdrantRAG._known_collections):
+            if not collection_name.startswith("subject_") or collection_name == shared_name:
+                continue
+            
+            fallback_subject = subject_names.get(collection_name)
+            copied[collection_name] = 0
+            skipped[collection_name] = 0
+            offset = None
+            while True:
+                points, offset = client.scroll(
+                    collection_name=collection_name,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                batch = []
+                for point in points:
+                    payload = dict(point.payload or {})
+                    if not payload.get("subject"):
+                        if not fallback_subject:
+                            skipped[collection_name] += 1
+                            continue
+                        payload["subject"] = fallback_subject
+                    batch.append(PointStruct(id=point.id, vector=point.vector, payload=payload))
+                
+                if batch:
+                    client.upsert(collection_name=shared_name, points=batch)
+                    copied[collection_name] += len(batch)
+                    if on_progress:
+                        on_progress(collection_name, copied[collection_name])
+                if offset is None:
+                    break
+        
+        QdrantRAG.invalidate_subject_cache()
+        return copied, skipped
+    
+    @staticmethod
+    def set_document_verified(subject, doc_id, verified=True):
+        """Mark all chunks of a document as verified (or not) so searches can filter on it"""
+        try:
+            client = QdrantRAG.get_client()
+            if not client or not subject or not doc_id:
+                return False
+            
+            collection_name = QdrantRAG.get_collection_name(subject)
+            
+            client.set_payload(
+                collection_name=collection_name,
+                payload={"verified": verified},
+                points=QdrantRAG.build_filter(doc_ids=[doc_id])
+            )
+            return True
+            
+        except Exception as e:
+            st.warning(f"Could not update verified flag in Qdrant: {e}")
+            return False
+    
+    @staticmethod
+    def format_sources(documents):
+        """Sources block appended after an AI answer"""
+        sources = "\n\n---\n\n📚 **Sources used:**\n"
+        for idx, doc in enumerate(documents, 1):
+            sources += f"{idx}. {doc['file_name']} (relevance: {doc['score']*100:.1f}%)\n"
+        return sources
+    
+    @staticmethod
+    def generate_rag_response_stream(query, subject, language="English"):
+        """
+        Generate RAG response using LLM (OpenAI/Anthropic), yielding text as it
+        arrives. The sources block is yielded last.
         """
         try:
+            # Repeated questions are answered straight from the cache
+            cache = QdrantRAG.get_response_cache()
+            cache_key = (subject, QdrantRAG.normalize_query(query), language)
+            cached_response = cache.get(cache_key)
+            if cached_response is not None:
+                yield cached_response
+                return
+            
             # Search for relevant documents
             documents = QdrantRAG.search_documents(query, subject, limit=5)
             
             if not documents:
-                return f"❌ **No relevant information found**\n\nI couldn't find anything about '{query}' in the uploaded {subject} materials.\n\n**Try:**\n• Uploading notes or past papers for this topic\n• Using different keywords\n• Asking about topics covered in existing files"
+                yield f"❌ **No relevant information found**\n\nI couldn't find anything about '{query}' in the uploaded {subject} materials.\n\n**Try:**\n• Uploading notes or past papers for this topic\n• Using different keywords\n• Asking about topics covered in existing files"
+                return
             
-            # Build context from documents
-            context = "\n\n".join([
-                f"Source: {doc['file_name']}\n{doc['text']}"
-                for doc in documents
-            ])
+            # Build context from documents within the prompt token budget
+            context, context_documents = pack_context(
+                query,
+                documents,
+                token_budget=int(LLMClients.get_setting("context_token_budget", 1500)),
+                min_score=float(LLMClients.get_setting("min_context_score", 0.2))
+            )
             
-            # === ADD YOUR LLM API HERE ===
-            # Option 1: OpenAI (Recommended - cheaper)
+            # OpenAI first (cheaper), Anthropic as fallback - see LLMClients.stream_answer
+            header = "🤖 **AI Answer:**\n\n"
+            pieces = []
             try:
-                from openai import OpenAI
-                
-                api_key = st.secrets.get("openai", {}).get("api_key", "")
-                
-                if api_key and api_key.startswith("sk-"):
-                    client = OpenAI(api_key=api_key)
-                    
-                    prompt = f"""You are a helpful study assistant. Answer the student's question using ONLY the provided context from their study materials.
-
-Question: {query}
-Subject: {subject}
-Language: {language}
-
-Context from uploaded materials:
-{context}
-
-Instructions:
-1. Answer in {language}
-2. Be clear and concise
-3. Only use information from the context
-4. If the context doesn't contain the answer, say so
-5. Cite which source you're using
-
-Answer:"""
-                    
-                    response = client.chat.completions.create(
-                        model="gpt-4o-mini",  # Cheap: $0.50 per 1M tokens
-                        messages=[
-                            {"role": "system", "content": "You are a helpful study assistant."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=500,
-                        temperature=0.7
-                    )
-                    
-                    ai_answer = response.choices[0].message.content
-                    
-                    # Format response nicely
-                    final_response = f"🤖 **AI Answer:**\n\n{ai_answer}\n\n---\n\n"
-                    final_response += f"📚 **Sources used:**\n"
-                    for idx, doc in enumerate(documents, 1):
-                        final_response += f"{idx}. {doc['file_name']} (relevance: {doc['score']*100:.1f}%)\n"
-                    
-                    return final_response
+                for token in LLMClients.stream_answer(query, subject, language, context):
+                    if not pieces:
+                        yield header
+                    pieces.append(token)
+                    yield token
             except Exception as e:
-                st.warning(f"⚠️ OpenAI API error: {e}")
+                if pieces:
+                    # Tokens already shown - can't switch provider mid-answer
+                    yield f"\n\n⚠️ *Answer interrupted: {e}*"
+                    return
+                st.warning(f"⚠️ LLM API error: {e}")
             
-            # Option 2: Anthropic Claude (Better quality, more expensive)
-            try:
-                import anthropic
-                client = anthropic.Anthropic(api_key=st.secrets.get("anthropic", {}).get("api_key", ""))
-                
-                message = client.messages.create(
-                    model="claude-3-haiku-20240307",  # Cheapest Claude
-                    max_tokens=500,
-                    messages=[{
-                        "role": "user",
-                        "content": f"""Answer this question using ONLY the provided context.
-
-Question: {query}
-Language: {language}
-
-Context: {context}
-
-Answer clearly in {language}:"""
-                    }]
-                )
-                
-                ai_answer = message.content[0].text
-                
-                final_response = f"🤖 **AI Answer:**\n\n{ai_answer}\n\n---\n\n"
-                final_response += f"📚 **Sources used:**\n"
-                for idx, doc in enumerate(documents, 1):
-                    final_response += f"{idx}. {doc['file_name']} (relevance: {doc['score']*100:.1f}%)\n"
-                
-                return final_response
-            except Exception as e:
-                st.warning(f"⚠️ Anthropic API not configured: {e}")
+            if pieces:
+                sources = QdrantRAG.format_sources(context_documents)
+                yield sources
+                cache.set(cache_key, header + "".join(pieces) + sources)
+                return
             
             # === FALLBACK: No LLM API configured ===
             # Show raw excerpts (current behavior)
@@ -354,69 +1119,121 @@ Answer clearly in {language}:"""
             response += f"Add OpenAI or Anthropic API key to `.streamlit/secrets.toml`\n\n"
             response += f"Example:\n```toml\n[openai]\napi_key = 'sk-...'\n```"
             
-            return response
+            yield response
             
         except Exception as e:
             st.error(f"Error generating response: {e}")
-            return f"❌ **Error:** {str(e)}\n\nPlease check your Qdrant connection."
+            yield f"❌ **Error:** {str(e)}\n\nPlease check your Qdrant connection."
     
     @staticmethod
-    def get_document_summary(file_name, subject):
-        """Get summary of a specific document - NO filters, pure Python filtering"""
+    def generate_rag_response(query, subject, language="English"):
+        """
+        Generate intelligent RAG response using LLM (OpenAI/Anthropic)
+        """
+        return "".join(QdrantRAG.generate_rag_response_stream(query, subject, language))
+    
+    @staticmethod
+    def get_document_chunks(subject, doc_id=None, file_name=None, max_chunks=None, page_size=256):
+        """
+        Return (chunk_index, text) pairs for one document, ordered by chunk_index.
+        Uses the doc_id index (or file_name when no doc_id is known) and pages
+        through the scroll; max_chunks stops after the first N chunks.
+        """
+        client = QdrantRAG.get_client()
+        if not client:
+            return []
+        
+        collection_name = QdrantRAG.get_collection_name(subject)
+        
+        if doc_id:
+            doc_filter = QdrantRAG.build_filter(subject=subject, doc_ids=[doc_id])
+        else:
+            doc_filter = QdrantRAG.build_filter(subject=subject, file_names=[file_name])
+        
+        # Only fetch the leading chunks when the caller needs a preview
+        if max_chunks:
+            doc_filter.must.append(FieldCondition(key="chunk_index", range=Range(lt=max_chunks)))
+        
+        chunks = []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=doc_filter,
+                limit=min(page_size, max_chunks) if max_chunks else page_size,
+                offset=offset,
+                with_payload=["text", "chunk_index"],
+                with_vectors=False
+            )
+            
+            for point in points:
+                chunks.append((point.payload.get("chunk_index", 0), point.payload.get("text", "")))
+            
+            if offset is None or (max_chunks and len(chunks) >= max_chunks):
+                break
+        
+        chunks.sort(key=lambda x: x[0])
+        return chunks[:max_chunks] if max_chunks else chunks
+    
+    @staticmethod
+    def count_document_chunks(subject, doc_id=None, file_name=None):
+        """Count the chunks stored for one document"""
+        client = QdrantRAG.get_client()
+        if not client:
+            return 0
+        
+        collection_name = QdrantRAG.get_collection_name(subject)
+        
+        if doc_id:
+            doc_filter = QdrantRAG.build_filter(subject=subject, doc_ids=[doc_id])
+        else:
+            doc_filter = QdrantRAG.build_filter(subject=subject, file_names=[file_name])
+        
+        return client.count(
+            collection_name=collection_name,
+            count_filter=doc_filter,
+            exact=True
+        ).count
+    
+    @staticmethod
+    def get_document_summary(file_name, subject, doc_id=None):
+        """Get summary of a specific document from its first few chunks"""
         try:
             client = QdrantRAG.get_client()
             if not client:
                 return "⚠️ Qdrant not configured"
             
-            collection_name = f"subject_{subject.lower().replace(' ', '_').replace('+', '').replace('(', '').replace(')', '').replace(',', '')}"
+            collection_name = QdrantRAG.get_collection_name(subject)
             
             # Check if collection exists
             try:
-                collections = client.get_collections().collections
-                collection_exists = any(col.name == collection_name for col in collections)
-                
-                if not collection_exists:
+                if not QdrantRAG.collection_exists(collection_name):
                     return f"No vector database found for {subject}. Upload files first."
             except:
                 return "Could not check collections."
             
-            # Get ALL points without any filters
+            # Fetch only this document's leading chunks via the payload indexes
             try:
-                # Use scroll with no filters at all
-                all_points, _ = client.scroll(
-                    collection_name=collection_name,
-                    limit=200,  # Get more points to ensure we find the file
-                    with_payload=True,
-                    with_vectors=False  # Don't need vectors, just payload
+                matching_chunks = QdrantRAG.get_document_chunks(
+                    subject,
+                    doc_id=doc_id,
+                    file_name=file_name,
+                    max_chunks=3
                 )
                 
-                if not all_points or len(all_points) == 0:
-                    return "No documents found in this collection."
-                
-                # Filter for matching file_name in Python (not in Qdrant)
-                matching_chunks = []
-                for point in all_points:
-                    point_file = point.payload.get("file_name", "")
-                    # Case-insensitive comparison
-                    if point_file.lower() == file_name.lower():
-                        chunk_text = point.payload.get("text", "")
-                        chunk_index = point.payload.get("chunk_index", 0)
-                        matching_chunks.append((chunk_index, chunk_text))
-                
                 if not matching_chunks:
-                    return f"No content found for '{file_name}'. Available files in collection: {len(set(p.payload.get('file_name', 'Unknown') for p in all_points))}"
-                
-                # Sort by chunk index
-                matching_chunks.sort(key=lambda x: x[0])
+                    return f"No content found for '{file_name}'."
                 
                 # Combine first few chunks as summary
-                summary_chunks = [text for _, text in matching_chunks[:3]]
+                summary_chunks = [text for _, text in matching_chunks]
                 summary = "\n\n".join(summary_chunks)
                 
                 if len(summary) > 1000:
                     summary = summary[:1000] + "..."
                 
-                return f"📄 **{file_name}**\n\n{summary}\n\n💡 Contains {len(matching_chunks)} sections total."
+                total_chunks = QdrantRAG.count_document_chunks(subject, doc_id=doc_id, file_name=file_name)
+                
+                return f"📄 **{file_name}**\n\n{summary}\n\n💡 Contains {total_chunks} sections total."
                 
             except Exception as scroll_error:
                 return f"Error reading collection: {str(scroll_error)}"
@@ -436,7 +1253,7 @@ Answer clearly in {language}:"""
             for doc in subjects:
                 subject_data = doc.to_dict()
                 subject_name = f"{subject_data.get('name', '')} ({subject_data.get('category', '')})"
-                collection_name = f"subject_{subject_name.lower().replace(' ', '_').replace('+', '').replace('(', '').replace(')', '').replace(',', '')}"
+                collection_name = QdrantRAG.get_collection_name(subject_name)
                 
                 if QdrantRAG.create_collection_if_not_exists(collection_name):
                     created.append(subject_name)